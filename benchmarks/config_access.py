@@ -0,0 +1,46 @@
+"""
+Compare the per-access cost of a mutable Config with its frozen snapshot (Config.freeze()).
+
+    python benchmarks/config_access.py --number 1000000
+"""
+
+import argparse
+import pickle
+import timeit
+
+from zarth_utils.config import Config
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=1000000)
+    args = parser.parse_args()
+
+    config = Config(
+        default_config_dict={
+            "lr": 0.1,
+            "model": {"dropout": 0.1, "layers": [64, 64], "head": {"act": "relu"}},
+            "data": {"name": "cifar10", "batch_size": 128},
+        },
+        use_argparse=False,
+    )
+    frozen = config.freeze()
+    cases = [
+        ("config.model.dropout", lambda: config.model.dropout),
+        ("frozen.model.dropout", lambda: frozen.model.dropout),
+        ('config["model.head.act"]', lambda: config["model.head.act"]),
+        ('frozen["model.head.act"]', lambda: frozen["model.head.act"]),
+        ('config.get("data.batch_size")', lambda: config.get("data.batch_size")),
+        ('frozen.get("data.batch_size")', lambda: frozen.get("data.batch_size")),
+    ]
+    for name, func in cases:
+        seconds = min(timeit.repeat(func, number=args.number, repeat=3))
+        print("%-32s %8.1f ns/access" % (name, seconds / args.number * 1e9))
+    print(
+        "pickled size: config %d bytes, frozen %d bytes"
+        % (len(pickle.dumps(config)), len(pickle.dumps(frozen)))
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Measure the import time of every zarth_utils module in a fresh interpreter, and list the heavy dependencies each
+import pulls in.
+
+    python benchmarks/import_time.py --repeat 5
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+MODULES = [
+    "config",
+    "drawer",
+    "general_utils",
+    "logger",
+    "nn_utils",
+    "recorder",
+    "timer",
+]
+HEAVY_MODULES = [
+    "git",
+    "joblib",
+    "matplotlib",
+    "pandas",
+    "sklearn",
+    "tensorflow",
+    "torch",
+    "tqdm",
+    "wandb",
+]
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import zarth_utils.%s
+seconds = time.perf_counter() - start
+print(json.dumps([seconds, [m for m in %r if m in sys.modules]]))
+"""
+
+
+def measure(module):
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT % (module, HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for module in MODULES:
+        results = [measure(module) for _ in range(args.repeat)]
+        seconds = min(r[0] for r in results)
+        print(
+            "%-16s %8.1f ms  heavy: %s"
+            % (module, seconds * 1e3, ", ".join(results[0][1]) or "-")
+        )
+
+
+if __name__ == "__main__":
+    main()
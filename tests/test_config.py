@@ -1,5 +1,9 @@
+import os
+import json
+import pickle
+import tempfile
 from unittest import TestCase
-from zarth_utils.config import Config
+from zarth_utils.config import Config, NestedDict, smart_load
 
 
 class TestConfig(TestCase):
@@ -35,3 +39,71 @@ class TestConfig(TestCase):
         self.assertEqual(config["b"].e["f"], "F")
         self.assertEqual(config.b.e["f"], "F")
         self.assertEqual(config.b["e"].f, "F")
+
+    def test_nested_dict_keys(self):
+        config = NestedDict({"a": 1, "b": {"c": 2}})
+        self.assertListEqual(config.keys(), ["a", "b.c"])
+        self.assertIn("b.c", config)
+        self.assertIn("b", config)
+        config.a = 3
+        config.b.d = 4
+        self.assertListEqual(config.keys(), ["a", "b.c", "b.d"])
+        self.assertEqual(config.get("b.d"), 4)
+        self.assertIsNone(config.get("b"))
+        config["b"]["e"] = {"f": 5}
+        self.assertEqual(config.get("b.e.f"), 5)
+        del config["b"]
+        self.assertListEqual(config.keys(), ["a"])
+        self.assertNotIn("b.c", config)
+        shared = NestedDict({"x": 1})
+        config["c"] = shared
+        other = NestedDict({"d": shared})
+        self.assertListEqual(other.keys(), ["d.x"])
+        shared.y = 2
+        self.assertListEqual(config.keys(), ["a", "c.x", "c.y"])
+        self.assertListEqual(other.keys(), ["d.x", "d.y"])
+
+    def test_freeze(self):
+        config = Config(
+            default_config_dict={"lr": 0.1, "model": {"dropout": 0.5, "layers": [64, 64]}},
+            use_argparse=False,
+        )
+        frozen = config.freeze()
+        self.assertEqual(frozen.model.dropout, 0.5)
+        self.assertEqual(frozen["model.layers"], (64, 64))
+        self.assertEqual(frozen.get("model.act", "relu"), "relu")
+        self.assertListEqual(frozen.keys(), config.keys())
+        with self.assertRaises(TypeError):
+            frozen.lr = 0.2
+        config.lr = 0.2
+        self.assertEqual(frozen.lr, 0.1)
+        restored = pickle.loads(pickle.dumps(frozen))
+        self.assertEqual(restored, frozen)
+        self.assertEqual(hash(restored), hash(frozen))
+        self.assertEqual(restored.model.dropout, 0.5)
+
+        thawed = frozen.to_dict()
+        self.assertListEqual(thawed.keys(), ["lr", "model.dropout", "model.layers"])
+        thawed.model.depth = 3
+        self.assertIn("model.depth", thawed.keys())
+        self.assertEqual(thawed.get("model.depth"), 3)
+
+    def test_smart_load_base(self):
+        with tempfile.TemporaryDirectory() as dir_tmp:
+            path_base = os.path.join(dir_tmp, "base.yaml")
+            path_child = os.path.join(dir_tmp, "child.json")
+            with open(path_base, "w") as fout:
+                fout.write("lr: 0.1\nmodel:\n  depth: 18\n  width: 64\n")
+            with open(path_child, "w") as fout:
+                json.dump({"_base_": "base.yaml", "model": {"depth": 50}}, fout)
+            loaded = smart_load(path_child)
+            self.assertDictEqual(loaded, {"lr": 0.1, "model": {"depth": 50, "width": 64}})
+            loaded["lr"] = 1.0
+            self.assertEqual(smart_load(path_child)["lr"], 0.1)
+
+            with open(path_base, "w") as fout:
+                fout.write("lr: 0.2\nmodel:\n  depth: 18\n")
+            os.utime(path_base, ns=(0, 0))
+            config = Config(default_config_file=path_child, use_argparse=False)
+            self.assertEqual(config.lr, 0.2)
+            self.assertListEqual(config.keys(), ["lr", "model.depth"])
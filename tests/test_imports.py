@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+import tempfile
+import types
+from unittest import TestCase
+
+from zarth_utils.general_utils import LazyModule
+
+HEAVY_MODULES = [
+    "git",
+    "joblib",
+    "matplotlib",
+    "pandas",
+    "sklearn",
+    "tensorflow",
+    "torch",
+    "tqdm",
+    "wandb",
+]
+
+
+class TestImports(TestCase):
+    def test_lazy_imports(self):
+        script = (
+            "import sys\n"
+            "import zarth_utils.config, zarth_utils.recorder, zarth_utils.nn_utils, zarth_utils.drawer\n"
+            "print(','.join(m for m in %r if m in sys.modules))\n" % HEAVY_MODULES
+        )
+        with tempfile.TemporaryDirectory() as dir_tmp:
+            output = subprocess.run(
+                [sys.executable, "-c", script],
+                cwd=dir_tmp,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            self.assertEqual(output.stdout.strip(), "")
+            self.assertListEqual(os.listdir(dir_tmp), [])
+
+    def test_lazy_module_rebinding(self):
+        module = types.ModuleType("zarth_utils_lazy_test")
+        module.log = "first"
+        sys.modules[module.__name__] = module
+        try:
+            lazy = LazyModule(module.__name__)
+            self.assertEqual(lazy.log, "first")
+            module.log = "second"
+            self.assertEqual(lazy.log, "second")
+            self.assertTrue(lazy.is_loaded())
+        finally:
+            del sys.modules[module.__name__]
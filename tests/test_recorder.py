@@ -0,0 +1,704 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase, mock
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from zarth_utils.config import Config
+from zarth_utils.recorder import (
+    Recorder,
+    BufferedRecordWriter,
+    load_ended_results,
+    load_result,
+    load_metrics,
+    load_metric_series,
+    collect_results,
+    collect_dead_results,
+    ResultTailer,
+    DistributedRecorder,
+    aggregate_results,
+    ColumnAnalyzer,
+    simple_read_results_pipeline,
+    get_trajectories,
+    get_column_index,
+    get_max_epoch,
+    get_recorded_metrics,
+    get_trajectory,
+    to_long_format,
+    to_wide_format,
+    merge_result_caches,
+    ResultFingerprintIndex,
+)
+from zarth_utils.general_utils import read_manifest
+from zarth_utils.nn_utils import get_all_paths
+from zarth_utils.result_archive import pack_results
+from zarth_utils.result_cache import ResultCache
+
+
+class TestRecorder(TestCase):
+    def setUp(self):
+        self.dir_tmp = tempfile.TemporaryDirectory()
+        self.path_record = os.path.join(self.dir_tmp.name, "exp")
+
+    def tearDown(self):
+        self.dir_tmp.cleanup()
+
+    def test_buffered_recorder(self):
+        recorder = Recorder(
+            self.path_record, use_git=False, buffered=True, flush_every=1000
+        )
+        for i in range(10):
+            recorder.add("loss", 1.0 / (i + 1), epoch=i)
+        recorder.flush()
+        result, ended = load_result(recorder.path_temp_record)
+        self.assertFalse(ended)
+        self.assertEqual(result["epoch_9-loss"], 0.1)
+
+        recorder.add("test_acc", 0.9)
+        recorder.end_recording()
+        result, ended = load_result(recorder.path_record)
+        self.assertTrue(ended)
+        self.assertEqual(result["test_acc"], 0.9)
+        self.assertEqual(result["epoch_0-loss"], 1.0)
+
+    def test_structured_metrics(self):
+        recorder = Recorder(self.path_record, use_git=False, structured_metrics=True)
+        for epoch in range(3):
+            for step in range(2):
+                recorder.add("loss", epoch + step * 0.5, epoch=epoch, step=step)
+        recorder.add("test_acc", 0.9)
+        recorder.add("confusion", np.eye(2), epoch=0)
+        x, y = recorder.get_trajectory("loss", by="epoch")
+        self.assertListEqual(list(x), [0, 0, 1, 1, 2, 2])
+        self.assertListEqual(list(y), [0.0, 0.5, 1.0, 1.5, 2.0, 2.5])
+        self.assertEqual(recorder.to_dict()["epoch_2-step_1-loss"], 2.5)
+        self.assertEqual(recorder["epoch_1-step_1-loss"], 1.5)
+        self.assertIn("epoch_0-step_0-loss", recorder.keys())
+        self.assertIn("test_acc", recorder.keys())
+        with self.assertRaises(KeyError):
+            recorder["epoch_5-step_0-loss"]
+        with self.assertRaises(AssertionError):
+            recorder["epoch_0-step_1-loss"] = 2.0
+        recorder["epoch_9-acc"] = 0.5
+        with self.assertRaises(AssertionError):
+            recorder.add("acc", 0.6, epoch=9)
+        recorder.end_recording()
+
+        metrics = load_metrics(recorder.path_record)
+        self.assertEqual(len(metrics["loss"]), 6)
+        np.testing.assert_array_equal(metrics["confusion"].values[0], np.eye(2))
+        result, ended = load_result(recorder.path_record)
+        self.assertTrue(ended)
+        self.assertEqual(result["epoch_1-step_0-loss"], 1.0)
+        self.assertEqual(result["test_acc"], 0.9)
+
+    def test_collect_results(self):
+        for i in range(4):
+            recorder = Recorder(
+                os.path.join(self.dir_tmp.name, "exp_%d" % i),
+                config=Config(default_config_dict={"lr": i}, use_argparse=False),
+                use_git=False,
+            )
+            recorder.add("test_acc", i / 10)
+            recorder.end_recording()
+        data = collect_results(self.dir_tmp.name, num_workers=2, chunksize=1)
+        self.assertEqual(len(data), 4)
+        self.assertSetEqual(set(data["config.lr"]), {0, 1, 2, 3})
+
+        recorder = Recorder(os.path.join(self.dir_tmp.name, "exp_4"), use_git=False)
+        recorder.end_recording()
+        data = collect_results(self.dir_tmp.name, num_workers=2, chunksize=1)
+        self.assertEqual(len(data), 5)
+        self.assertEqual(len(data["path"].unique()), 5)
+
+    def test_load_ended_results_order(self):
+        paths = []
+        for i in range(6):
+            recorder = Recorder(
+                os.path.join(self.dir_tmp.name, "exp_%d" % i), use_git=False
+            )
+            recorder.add("test_acc", i / 10)
+            recorder.end_recording()
+            paths.append(recorder.path_record)
+        paths = paths[::-1]
+        loaded = list(load_ended_results(paths, num_workers=3, chunksize=1))
+        self.assertListEqual([path for path, _, _ in loaded], paths)
+
+    def test_collect_results_columnar(self):
+        for i in range(3):
+            recorder = Recorder(
+                os.path.join(self.dir_tmp.name, "exp_%d" % i),
+                config=Config(default_config_dict={"lr": i}, use_argparse=False),
+                use_git=False,
+            )
+            recorder.add("test_acc", i / 10)
+            recorder.add("loss", float(i), epoch=0)
+            recorder.end_recording()
+            data = collect_results(
+                self.dir_tmp.name, pickled_filename=".cache", cache_format="columnar"
+            )
+            self.assertEqual(len(data), i + 1)
+
+        data_long, data_config = collect_results(
+            self.dir_tmp.name,
+            pickled_filename=".cache",
+            cache_format="columnar",
+            return_type="long",
+        )
+        self.assertEqual(len(data_config), 3)
+        self.assertListEqual(sorted(data_long["run_id"]), [0, 1, 2])
+        self.assertListEqual(
+            sorted(data_config.loc[data_long["run_id"], "test_acc"] * 10),
+            sorted(data_long["value"]),
+        )
+
+        cache = ResultCache(os.path.join(self.dir_tmp.name, ".cache"))
+        self.assertEqual(len(cache.get_partitions()), 3)
+        self.assertIn(recorder.path_record, cache)
+        cache.compact()
+        self.assertEqual(len(cache.get_partitions()), 1)
+        dir_partition = os.path.join(cache.dir_cache, cache.get_partitions()[0])
+        self.assertEqual(len(os.listdir(dir_partition)), 2)
+        data = cache.read(columns=["path", "test_acc"])
+        self.assertListEqual(list(data.columns), ["path", "test_acc"])
+        self.assertListEqual(sorted(data["test_acc"]), [0.0, 0.1, 0.2])
+
+    def test_result_summary(self):
+        recorder = Recorder(
+            self.path_record,
+            config=Config(default_config_dict={"lr": 0.1}, use_argparse=False),
+            use_git=False,
+        )
+        for epoch in range(5):
+            recorder.add("loss", 1.0 / (epoch + 1), epoch=epoch)
+            recorder.add("acc", epoch / 10, epoch=epoch)
+        recorder.add("test_acc", 0.9)
+        recorder.end_recording()
+
+        summary, ended = load_result(recorder.path_record, summary_only=True)
+        self.assertTrue(ended)
+        self.assertEqual(summary["config.lr"], 0.1)
+        self.assertEqual(summary["loss"], 0.2)
+        self.assertEqual(summary["test_acc"], 0.9)
+        self.assertNotIn("epoch_0-loss", summary)
+        result, ended = load_result(recorder.path_record)
+        self.assertTrue(ended)
+        self.assertEqual(result["epoch_4-loss"], 0.2)
+
+        x, y = load_metric_series(recorder.path_record, "acc").get_trajectory()
+        self.assertListEqual(list(x), [0, 1, 2, 3, 4])
+        self.assertListEqual(list(y), [0.0, 0.1, 0.2, 0.3, 0.4])
+
+        data = collect_results(
+            self.dir_tmp.name,
+            summary_condition_func=lambda r: r["config.lr"] == 0.2,
+            num_workers=1,
+        )
+        self.assertEqual(len(data), 0)
+
+    def test_result_tailer(self):
+        recorder = Recorder(self.path_record, use_git=False)
+        tailer = ResultTailer()
+        records, ended = tailer.read_new(recorder.path_temp_record)
+        self.assertFalse(ended)
+        self.assertIn(
+            "meta_data.start_time", tailer.get_result(recorder.path_temp_record)
+        )
+
+        recorder.add("loss", 1.0, epoch=0)
+        with open(recorder.path_temp_record, "a", encoding="utf-8") as fout:
+            fout.write('{"epoch_1-loss": 0.5')
+        records, ended = tailer.read_new(recorder.path_temp_record)
+        self.assertListEqual(records, [{"epoch_0-loss": 1.0}])
+        with open(recorder.path_temp_record, "a", encoding="utf-8") as fout:
+            fout.write("}\n")
+        records, ended = tailer.read_new(recorder.path_temp_record)
+        self.assertListEqual(records, [{"epoch_1-loss": 0.5}])
+
+        data = collect_dead_results(self.dir_tmp.name, tailer=tailer)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data["epoch_1-loss"].values[0], 0.5)
+
+    def test_async_metadata(self):
+        recorder = Recorder(self.path_record, use_git=False, async_metadata=True)
+        recorder.add("loss", 1.0, epoch=0)
+        recorder.end_recording()
+        result, ended = load_result(recorder.path_record)
+        self.assertTrue(ended)
+        self.assertIn("meta_data.platform", result)
+        self.assertEqual(result["epoch_0-loss"], 1.0)
+
+    def test_async_metadata_error(self):
+        with mock.patch(
+            "zarth_utils.recorder.get_git_commit", side_effect=AssertionError
+        ):
+            recorder = Recorder(self.path_record, async_metadata=True)
+            with self.assertRaises(AssertionError):
+                recorder.wait_metadata()
+            with self.assertRaises(AssertionError):
+                recorder.add("loss", 1.0, epoch=0)
+            with self.assertRaises(AssertionError):
+                recorder.end_recording()
+        result, ended = load_result(recorder.path_record)
+        self.assertTrue(ended)
+        self.assertIn("meta_data.metadata_error", result)
+        self.assertFalse(os.path.exists(recorder.path_temp_record))
+
+    def test_batch_metrics(self):
+        with mock.patch("zarth_utils.recorder.wandb") as mock_wandb:
+            recorder = Recorder(
+                self.path_record,
+                use_git=False,
+                use_wandb=True,
+                batch_metrics=True,
+                background_commit=True,
+            )
+            for epoch in range(3):
+                recorder.update({"loss": 1.0 / (epoch + 1), "acc": epoch / 10}, epoch)
+            recorder.end_recording()
+        self.assertEqual(mock_wandb.log.call_count, 3)
+        mock_wandb.log.assert_called_with(
+            {"loss": 1.0 / 3, "acc": 0.2, "epoch": 2}, step=2
+        )
+        result, ended = load_result(recorder.path_record)
+        self.assertTrue(ended)
+        self.assertEqual(result["epoch_2-acc"], 0.2)
+
+    def test_buffered_writer_fsync(self):
+        path_file = os.path.join(self.dir_tmp.name, "buffered.txt")
+        with mock.patch("zarth_utils.recorder.os.fsync") as fsync:
+            writer = BufferedRecordWriter(path_file, flush_interval=0.01, fsync="flush")
+            time.sleep(0.05)
+            self.assertEqual(fsync.call_count, 0)
+            writer.write("line")
+            writer.flush()
+            self.assertEqual(fsync.call_count, 1)
+            writer.flush(fsync=True)
+            self.assertEqual(fsync.call_count, 2)
+            writer.close()
+        with open(path_file, "r", encoding="utf-8") as fin:
+            self.assertEqual(fin.read(), "line\n")
+
+    def test_bounded_memory(self):
+        recorder = Recorder(
+            self.path_record, use_git=False, buffered=True, bounded_memory=True
+        )
+        for step in range(100):
+            recorder.add("loss", float(step), step=step)
+        self.assertNotIn("step_0-loss", recorder.keys())
+        self.assertEqual(recorder.get_latest("loss"), 99.0)
+        self.assertEqual(recorder.get_aggregate("loss")["mean"], 49.5)
+        self.assertEqual(recorder["step_3-loss"], 3.0)
+        self.assertEqual(recorder.to_dict()["step_99-loss"], 99.0)
+        with self.assertRaises(AssertionError):
+            recorder.add("loss", 0.0, step=5)
+        recorder.end_recording()
+        result, ended = load_result(recorder.path_record)
+        self.assertEqual(result["step_42-loss"], 42.0)
+
+    def test_bounded_memory_background_commit(self):
+        write_batch = Recorder._Recorder__write_batch
+
+        def slow_write_batch(recorder, *args):
+            time.sleep(0.005)
+            write_batch(recorder, *args)
+
+        recorder = Recorder(
+            self.path_record,
+            use_git=False,
+            bounded_memory=True,
+            batch_metrics=True,
+            background_commit=True,
+        )
+        with mock.patch.object(Recorder, "_Recorder__write_batch", slow_write_batch):
+            for epoch in range(20):
+                recorder.add("loss", float(epoch), epoch=epoch)
+            history = recorder.to_dict()
+            self.assertEqual(recorder["epoch_3-loss"], 3.0)
+        self.assertEqual(
+            [history["epoch_%d-loss" % epoch] for epoch in range(20)],
+            [float(epoch) for epoch in range(20)],
+        )
+        recorder.end_recording()
+
+    def test_resume(self):
+        config = Config(default_config_dict={"lr": 0.1}, use_argparse=False)
+        recorder = Recorder(self.path_record, config=config, use_git=False)
+        for epoch in range(3):
+            recorder.add("loss", 1.0 / (epoch + 1), epoch=epoch)
+        with open(recorder.path_temp_record, "a", encoding="utf-8") as fout:
+            fout.write('{"epoch_3-loss": 0.2')
+
+        with self.assertRaises(AssertionError):
+            Recorder(
+                self.path_record,
+                config=Config(default_config_dict={"lr": 0.2}, use_argparse=False),
+                use_git=False,
+                resume=True,
+            )
+        recorder = Recorder(
+            self.path_record,
+            config=config,
+            use_git=False,
+            resume=True,
+            skip_recorded=True,
+        )
+        self.assertEqual(recorder["epoch_2-loss"], 1.0 / 3)
+        # resumed from the checkpoint of epoch 0
+        for epoch in range(1, 4):
+            recorder.add("loss", 0.25, epoch=epoch)
+        recorder.end_recording()
+        result, ended = load_result(recorder.path_record)
+        self.assertTrue(ended)
+        self.assertEqual(result["epoch_1-loss"], 0.5)
+        self.assertEqual(result["epoch_3-loss"], 0.25)
+        self.assertIn("meta_data.resume_time_0", result)
+        self.assertFalse(any(".mv." in f for f in os.listdir(self.dir_tmp.name)))
+
+    def test_distributed_recorder(self):
+        recorders = [
+            DistributedRecorder(
+                self.path_record,
+                rank=r,
+                world_size=3,
+                reduce_ops=("mean", "max"),
+                use_git=False,
+            )
+            for r in range(3)
+        ]
+        for r in [1, 2, 0]:
+            for epoch in range(2):
+                recorders[r].add("loss", np.float32(r + epoch), epoch=epoch)
+            recorders[r].end_recording()
+        result, ended = load_result(recorders[0].recorder.path_record)
+        self.assertTrue(ended)
+        self.assertEqual(result["epoch_0-loss"], 1.0)
+        self.assertEqual(result["epoch_1-loss_max"], 3.0)
+        self.assertFalse(
+            any(f.endswith(".spool") for f in os.listdir(self.dir_tmp.name))
+        )
+
+    def test_array_sidecar(self):
+        recorder = Recorder(self.path_record, use_git=False)
+        confusion = np.arange(9, dtype=np.float32).reshape(3, 3)
+        recorder.add("confusion", confusion, epoch=0)
+        recorder.add("acc", np.float64(0.5), epoch=0)
+        recorder.end_recording()
+        result, ended = load_result(recorder.path_record)
+        self.assertTrue(ended)
+        self.assertIsInstance(result["epoch_0-confusion"], np.memmap)
+        np.testing.assert_array_equal(result["epoch_0-confusion"], confusion)
+        self.assertEqual(result["epoch_0-acc"], 0.5)
+
+        dir_dump = os.path.join(self.dir_tmp.name, "dump")
+        os.makedirs(dir_dump)
+        recorder.dump(os.path.join(dir_dump, "dumped"))
+        result, _ = load_result(os.path.join(dir_dump, "dumped.result"))
+        np.testing.assert_array_equal(result["epoch_0-confusion"], confusion)
+
+        recorder = Recorder(self.path_record, use_git=False)
+        recorder.add("confusion", confusion + 1, epoch=0)
+        recorder.end_recording()
+        self.assertEqual(os.path.getsize(recorder.path_arrays), confusion.nbytes)
+        result, _ = load_result(recorder.path_record)
+        np.testing.assert_array_equal(result["epoch_0-confusion"], confusion + 1)
+
+    def test_pack_results(self):
+        for i in range(3):
+            recorder = Recorder(
+                os.path.join(self.dir_tmp.name, "exp_%d" % i), use_git=False
+            )
+            recorder.add("test_acc", i / 10)
+            recorder.add("weights", np.full(4, i, dtype=np.int64))
+            recorder.end_recording()
+        data = collect_results(self.dir_tmp.name, num_workers=1)
+        self.assertEqual(len(data), 3)
+
+        self.assertEqual(pack_results(self.dir_tmp.name), 3)
+        path_packed = os.path.join(self.dir_tmp.name, "results.rpack", "exp_1.result")
+        self.assertFalse(
+            os.path.exists(os.path.join(self.dir_tmp.name, "exp_1.result"))
+        )
+        result, ended = load_result(path_packed)
+        self.assertTrue(ended)
+        self.assertEqual(result["test_acc"], 0.1)
+        np.testing.assert_array_equal(result["weights"], [1, 1, 1, 1])
+        self.assertEqual(
+            load_result(path_packed, summary_only=True)[0]["test_acc"], 0.1
+        )
+
+        data = collect_results(self.dir_tmp.name, num_workers=1)
+        self.assertEqual(len(data), 3)
+        self.assertTrue(all(".rpack" in p for p in data["path"]))
+
+        # appended in place, and an interrupted append falls back to the last complete index
+        path_pack = os.path.join(self.dir_tmp.name, "results.rpack")
+        with open(path_pack, "rb") as fin:
+            content = fin.read()
+        with open(path_pack, "ab") as fout:
+            fout.write(b"interrupted")
+        recorder = Recorder(os.path.join(self.dir_tmp.name, "exp_3"), use_git=False)
+        recorder.add("test_acc", 0.3)
+        recorder.end_recording()
+        self.assertEqual(pack_results(self.dir_tmp.name), 1)
+        with open(path_pack, "rb") as fin:
+            self.assertEqual(fin.read(len(content)), content)
+        result, _ = load_result(os.path.join(path_pack, "exp_3.result"))
+        self.assertEqual(result["test_acc"], 0.3)
+        result, _ = load_result(path_packed)
+        np.testing.assert_array_equal(result["weights"], [1, 1, 1, 1])
+
+    def test_pack_results_subdirectory(self):
+        dir_sub = os.path.join(self.dir_tmp.name, "sub")
+        os.makedirs(dir_sub)
+        for i in range(3):
+            recorder = Recorder(os.path.join(dir_sub, "exp_%d" % i), use_git=False)
+            recorder.add("test_acc", i / 10)
+            recorder.end_recording()
+        self.assertEqual(len(collect_results(self.dir_tmp.name, num_workers=1)), 3)
+        self.assertEqual(pack_results(dir_sub), 3)
+        data = collect_results(self.dir_tmp.name, num_workers=1)
+        self.assertEqual(len(data), 3)
+        self.assertTrue(all(".rpack" in p for p in data["path"]))
+
+    def test_aggregate_results(self):
+        data = pd.DataFrame(
+            {
+                "config.lr": [0.1, 0.1, 0.2, 0.2, 0.2],
+                "acc": [0.5, 0.7, 0.8, 0.9, 1.0],
+            }
+        )
+        grouped = aggregate_results(
+            data,
+            ["config.lr"],
+            ["acc"],
+            stats=("mean", "std", "count", "max"),
+            quantiles=(0.5,),
+        )
+        self.assertListEqual(
+            list(grouped.columns),
+            ["config.lr", "acc", "acc_std", "acc_count", "acc_max", "acc_q50"],
+        )
+        self.assertListEqual(list(grouped["acc"]), [0.6, 0.9])
+        self.assertListEqual(list(grouped["acc_count"]), [2, 3])
+        self.assertListEqual(list(grouped["acc_max"]), [0.7, 1.0])
+        cached = aggregate_results(data, ["config.lr"], ["acc"], data_version="v0")
+        data["acc"] = 0.0
+        cached_again = aggregate_results(
+            data, ["config.lr"], ["acc"], data_version="v0"
+        )
+        pd.testing.assert_frame_equal(cached, cached_again)
+
+    def test_results_pipeline_memo(self):
+        path_default_config = os.path.join(self.dir_tmp.name, "default.json")
+        with open(path_default_config, "w") as fout:
+            fout.write('{"config": {"lr": 0.1, "random_seed": 0}}')
+        for i in range(4):
+            recorder = Recorder(
+                os.path.join(self.dir_tmp.name, "exp_%d" % i),
+                config=Config(
+                    default_config_dict={"lr": 0.1 * (i % 2 + 1), "random_seed": i},
+                    use_argparse=False,
+                ),
+                use_git=False,
+            )
+            recorder.add("test_acc", i / 10)
+            recorder.end_recording()
+
+        kwargs = {
+            "columns4show": ["test_acc"],
+            "path_default_config": path_default_config,
+        }
+        with mock.patch(
+            "zarth_utils.recorder.ColumnAnalyzer", wraps=ColumnAnalyzer
+        ) as mock_analyzer:
+            _, _, grouped = simple_read_results_pipeline(self.dir_tmp.name, **kwargs)
+            _, _, grouped_again = simple_read_results_pipeline(
+                self.dir_tmp.name, **kwargs
+            )
+        self.assertEqual(mock_analyzer.call_count, 1)
+        self.assertEqual(len(grouped), 2)
+        pd.testing.assert_frame_equal(grouped, grouped_again)
+
+    def test_column_analyzer(self):
+        config = Config(
+            default_config_dict={"lr": 0.1, "layers": [64, 64], "seed": 0},
+            use_argparse=False,
+        )
+        data = pd.DataFrame(
+            {
+                "lr": [0.1, np.nan, 0.2],
+                "layers": [[64, 64], [64, 64], np.nan],
+                "seed": [0, 1, 2],
+            }
+        )
+        analyzer = ColumnAnalyzer(data, config)
+        self.assertListEqual(
+            list(analyzer.count_distinct(["lr", "layers", "seed"])), [3, 2, 3]
+        )
+        analyzer.fill_config_na()
+        self.assertListEqual(list(data["lr"]), [0.1, 0.1, 0.2])
+        self.assertListEqual(data["layers"].values[2], [64, 64])
+        self.assertListEqual(
+            analyzer.get_informative_columns(exclude_key=("seed",)), ["lr"]
+        )
+
+    def test_trajectories(self):
+        data = pd.DataFrame(
+            {
+                "lr": [0.1, 0.1, 0.2],
+                "epoch_0-loss": [1.0, 3.0, 2.0],
+                "epoch_1-loss": [0.5, 1.5, np.nan],
+                "epoch_1-acc": [0.9, 0.7, 0.8],
+                "epoch_1-step_5-loss": [9.0, 9.0, 9.0],
+            }
+        )
+        ret = get_trajectories(data, ["loss", "acc"], group_by=["lr"])
+        self.assertTupleEqual(ret["trajectories"].shape, (3, 2, 2))
+        self.assertEqual(ret["trajectories"][0, 1, 0], 0.5)
+        self.assertTrue(np.isnan(ret["trajectories"][2, 1, 0]))
+        self.assertTrue(np.isnan(ret["trajectories"][0, 0, 1]))
+        self.assertListEqual(list(ret["groups"]["lr"]), [0.1, 0.2])
+        self.assertListEqual(list(ret["mean"][:, 0, 0]), [2.0, 2.0])
+        self.assertAlmostEqual(ret["std"][0, 1, 0], np.std([0.5, 1.5], ddof=1))
+        self.assertTrue(np.isnan(ret["std"][1, 0, 0]))
+        self.assertListEqual(list(ret["count"][:, 1, 0]), [2, 0])
+
+        data = pd.DataFrame(
+            {"lr": [0.1] * 3, "epoch_0-loss": 1e8 + np.arange(3) * 3e-3}
+        )
+        ret = get_trajectories(data, ["loss"], group_by=["lr"])
+        self.assertAlmostEqual(ret["std"][0, 0, 0], 3e-3, places=6)
+
+    def test_column_index(self):
+        data = pd.DataFrame(
+            {
+                "epoch_1-loss": [1.0],
+                "epoch_2-loss": [0.5],
+                "epoch_0-val_acc": [0.5],
+                "epoch_0-step_10-loss": [3.0],
+                "epoch_3-loss": [np.nan],
+                "step_120-loss": [0.1],
+            }
+        )
+        column_index = get_column_index(data)
+        self.assertIs(get_column_index(data), column_index)
+        self.assertEqual(column_index.get_position(0, "loss", step=10), 3)
+        self.assertEqual(column_index.get_position(None, "loss", step=120), 5)
+        self.assertEqual(get_max_epoch(data), 2)
+        self.assertSetEqual(get_recorded_metrics(data), {"loss", "val_acc"})
+        x, y = get_trajectory(data, "loss")
+        self.assertListEqual(x, [1, 2])
+        self.assertListEqual(y, [1.0, 0.5])
+
+    def test_long_format(self):
+        data = pd.DataFrame(
+            {
+                "path": ["a", "b"],
+                "lr": [0.1, 0.2],
+                "epoch_0-loss": [1.0, np.nan],
+                "epoch_1-loss": [0.5, 0.7],
+                "epoch_1-step_3-acc": [np.nan, 0.9],
+                "step_120-loss": [0.3, np.nan],
+            }
+        )
+        data_long, data_config = to_long_format(data, value_dtype=np.float32)
+        self.assertEqual(len(data_long), 5)
+        self.assertListEqual(
+            data_long.loc[data_long["step"] == 120, "epoch"].tolist(), [-1]
+        )
+        self.assertListEqual(list(data_long["metric"].cat.categories), ["acc", "loss"])
+        self.assertEqual(data_long["value"].dtype, np.float32)
+        self.assertListEqual(list(data_config.columns), ["path", "lr"])
+        wide = to_wide_format(data_long, data_config)
+        pd.testing.assert_frame_equal(
+            wide[data.columns], data, check_dtype=False, atol=1e-6
+        )
+
+    def test_merge_result_caches(self):
+        dirs = [os.path.join(self.dir_tmp.name, "host_%d" % i) for i in range(2)]
+        os.makedirs(dirs[0])
+        for i in range(3):
+            recorder = Recorder(
+                os.path.join(dirs[0], "exp_%d" % i),
+                config=Config(default_config_dict={"lr": i}, use_argparse=False),
+                use_git=False,
+            )
+            recorder.add("test_acc", i / 10)
+            recorder.end_recording()
+        shutil.copytree(dirs[0], dirs[1])
+        collect_results(dirs[0], cache_format="columnar", pickled_filename=".cache")
+        collect_results(dirs[1])
+
+        paths_cache = [
+            os.path.join(dirs[0], ".cache"),
+            os.path.join(dirs[1], ".pickled_results.jbl"),
+        ]
+        dir_merged = os.path.join(self.dir_tmp.name, "merged")
+        data = merge_result_caches(paths_cache, dir_merged)
+        self.assertEqual(len(data), 3)
+        self.assertEqual(len(data["run_id"].unique()), 3)
+
+        recorder = Recorder(
+            os.path.join(dirs[1], "exp_3"),
+            config=Config(default_config_dict={"lr": 3}, use_argparse=False),
+            use_git=False,
+        )
+        recorder.end_recording()
+        collect_results(dirs[1])
+        data = merge_result_caches(paths_cache, dir_merged)
+        self.assertEqual(len(data), 4)
+        self.assertEqual(len(ResultCache(dir_merged, key="run_id").get_partitions()), 2)
+
+        # a rewritten pickle without new runs is diffed against its index only
+        os.utime(paths_cache[1], (0, 0))
+        with mock.patch(
+            "zarth_utils.recorder.joblib.load", wraps=joblib.load
+        ) as joblib_load:
+            data = merge_result_caches(paths_cache, dir_merged)
+        self.assertEqual(len(data), 4)
+        self.assertNotIn(mock.call(paths_cache[1]), joblib_load.call_args_list)
+
+    def test_sharded_layout(self):
+        path_exp = os.path.join(self.dir_tmp.name, "exp")
+        for shard in ["hash", "date", "hash"]:
+            all_paths = get_all_paths(path_exp, "train", shard=shard)
+            recorder = Recorder(all_paths["path_record"], use_git=False)
+            recorder.end_recording()
+        dir_shard = os.path.dirname(all_paths["path_record"])
+        self.assertNotEqual(dir_shard, path_exp)
+        with open(os.path.join(dir_shard, "unlisted.result"), "w") as fout:
+            fout.write("")
+        data = collect_results(self.dir_tmp.name)
+        self.assertEqual(len(data), 3)
+        self.assertIn(recorder.path_record, list(data["path"]))
+
+        os.remove(os.path.join(dir_shard, "unlisted.result"))
+        for entry in read_manifest(path_exp):
+            pack_results(os.path.join(path_exp, entry["shard"]))
+        data = collect_results(path_exp, num_workers=1)
+        self.assertEqual(len(data), 3)
+
+    def test_fingerprint_index(self):
+        config = Config(
+            default_config_dict={"lr": 0.1, "layers": [64, 64], "load_epoch": 0},
+            use_argparse=False,
+        )
+        recorder = Recorder(self.path_record, config=config, use_git=False)
+        index = ResultFingerprintIndex(self.dir_tmp.name)
+        self.assertNotIn(config, index)
+        recorder.end_recording()
+        self.assertEqual(index.refresh(), 1)
+        self.assertIn(config, index)
+        config.load_epoch = 5
+        self.assertIn(config, index)
+        self.assertListEqual(index.get_paths(config), [recorder.path_record])
+        self.assertNotIn({"lr": 0.2, "layers": [64, 64]}, index)
+
+        index = ResultFingerprintIndex(self.dir_tmp.name)
+        self.assertEqual(index.refresh(), 0)
+        self.assertIn({"lr": 0.1, "layers": (64, 64)}, index)
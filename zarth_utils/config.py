@@ -1,39 +1,142 @@
 import os
+import copy
 import json
 import argparse
+import hashlib
+import keyword
 import logging
+import weakref
 
 import yaml
 
-from .general_utils import get_random_time_stamp, makedir_if_not_exist
+from .general_utils import LazyModule, get_random_time_stamp, makedir_if_not_exist
 from .logger import logging_info
 
-try:
-    import wandb
-except ModuleNotFoundError as err:
-    logging.warning("WandB not installed!")
-except TypeError as err:
-    logging.warning("WandB not properly installed!")
+wandb = LazyModule("wandb", "WandB not installed!")
 
 dir_configs = os.path.join(os.getcwd(), "configs")
 
 
-def smart_load(path_file):
-    if path_file.endswith("json"):
-        return json.load(open(path_file, "r", encoding="utf-8"))
-    elif path_file.endswith("yaml") or path_file.endswith("yml"):
-        return yaml.safe_load(open(path_file, "r", encoding="utf-8"))
-    else:
-        logging.warning(
-            "Un-identified file type. It will be processed as json by default."
+BASE_KEY = "_base_"
+
+_parsed_files = dict()
+_resolved_files = dict()
+
+
+def _get_file_version(path_file):
+    stat_result = os.stat(path_file)
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+
+def _parse_file(path_file):
+    """
+    Parse a json or yaml file, cached until the file changes.
+    """
+    version = _get_file_version(path_file)
+    if path_file in _parsed_files and _parsed_files[path_file][0] == version:
+        return _parsed_files[path_file][1]
+    with open(path_file, "r", encoding="utf-8") as fin:
+        if path_file.endswith("yaml") or path_file.endswith("yml"):
+            content = yaml.safe_load(fin)
+        else:
+            if not path_file.endswith("json"):
+                logging.warning(
+                    "Un-identified file type. It will be processed as json by default."
+                )
+            content = json.load(fin)
+    _parsed_files[path_file] = (version, content)
+    return content
+
+
+def _merge_dict(base, new):
+    ret = dict(base)
+    for k, v in new.items():
+        if isinstance(v, dict) and isinstance(ret.get(k, None), dict):
+            ret[k] = _merge_dict(ret[k], v)
+        else:
+            ret[k] = v
+    return ret
+
+
+def _resolve_file(path_file, loading):
+    """
+    Load a file with its bases merged, memoized until the file or any of its bases changes.
+    :return: the content and the versions of all the files it depends on
+    """
+    if path_file in _resolved_files:
+        content, dependencies = _resolved_files[path_file]
+        if all(
+            os.path.exists(p) and _get_file_version(p) == v
+            for p, v in dependencies.items()
+        ):
+            return content, dependencies
+    assert path_file not in loading, "Circular %s: %s" % (BASE_KEY, path_file)
+
+    content = _parse_file(path_file)
+    dependencies = {path_file: _get_file_version(path_file)}
+    if isinstance(content, dict) and BASE_KEY in content:
+        bases = content[BASE_KEY]
+        bases = [bases] if isinstance(bases, str) else bases
+        merged = dict()
+        for path_base in bases:
+            path_base = os.path.abspath(
+                os.path.join(os.path.dirname(path_file), path_base)
+            )
+            base_content, base_dependencies = _resolve_file(
+                path_base, loading | {path_file}
+            )
+            merged = _merge_dict(merged, base_content)
+            dependencies.update(base_dependencies)
+        content = _merge_dict(
+            merged, {k: v for k, v in content.items() if k != BASE_KEY}
         )
-        return json.load(open(path_file, "r", encoding="utf-8"))
+    _resolved_files[path_file] = (content, dependencies)
+    return content, dependencies
+
+
+def smart_load(path_file):
+    """
+    Load a json or yaml config file. A file may inherit other files by listing their paths, relative to itself,
+    under the key "_base_": the bases are merged recursively in order, then overridden by the file itself. Parsed
+    and resolved files are cached until any file involved is modified, and a deep copy is returned.
+    :param path_file: the path of the file
+    :type path_file: str
+    :return: the loaded content
+    :rtype: dict
+    """
+    return copy.deepcopy(_resolve_file(os.path.abspath(path_file), frozenset())[0])
+
+
+_split_keys = dict()
+_MAX_SPLIT_KEYS = 65536
+
+
+def _split_key(key):
+    """
+    Split a dotted key into its parts, cached so that repeated lookups do not split the same string again.
+    """
+    parts = _split_keys.get(key, None)
+    if parts is None:
+        parts = tuple(key.split("."))
+        if len(_split_keys) < _MAX_SPLIT_KEYS:
+            _split_keys[key] = parts
+    return parts
 
 
 class NestedDict(dict):
+    # the flat-key index and the parent links are stored as attributes with class-level defaults, since __getstate__
+    # does not keep them
+    _NestedDict__index_keys = None
+    _NestedDict__index_set = None
+    _NestedDict__parents = ()
+
     def __init__(self, *args, **kwargs):
         """
-        Every element could be visited by either attribute or dict manner.
+        Every element could be visited by either attribute or dict manner. Each NestedDict caches the index of its
+        flattened keys and links to the NestedDicts holding it, so that a structural change, i.e., adding or removing
+        a key, only invalidates the indices of the changed NestedDict and its ancestors, which are rebuilt lazily from
+        the cached indices of their children. Overwriting the value of an existing key keeps all the indices. In-place
+        changes of plain dict values are not tracked.
 
         Examples:
             >>> a = NestedDict()
@@ -45,9 +148,11 @@ class NestedDict(dict):
             2
         """
         super(NestedDict, self).__init__(*args, **kwargs)
-        for k in dict.keys(self):
-            if type(k) is dict:
-                dict.__setitem__(self, k, NestedDict(k))
+        for k, v in dict.items(self):
+            if type(v) is dict:
+                v = NestedDict(v)
+                dict.__setitem__(self, k, v)
+            self.__link(v)
 
     def __getattr__(self, item):
         return self[item]
@@ -60,23 +165,88 @@ class NestedDict(dict):
 
     def __getitem__(self, key):
         ret = self
-        for k in key.split("."):
+        for k in _split_key(key):
             ret = dict.__getitem__(ret, k)
         return ret
 
+    def __link(self, value):
+        """
+        Record self as a parent of value, if value is a NestedDict.
+        """
+        if type(value) is not NestedDict:
+            return
+        for ref in value.__parents:
+            if ref() is self:
+                return
+        parents = [ref for ref in value.__parents if ref() is not None]
+        parents.append(weakref.ref(self))
+        object.__setattr__(value, "_NestedDict__parents", parents)
+
+    def __invalidate(self):
+        """
+        Invalidate the index of self and its ancestors. Since a parent builds its index from those of its children,
+        an invalid ancestor implies that all of its own ancestors are invalid already.
+        """
+        to_be_invalidated = [self]
+        while len(to_be_invalidated) != 0:
+            cur = to_be_invalidated.pop()
+            if cur is not self and cur.__index_keys is None:
+                continue
+            object.__setattr__(cur, "_NestedDict__index_keys", None)
+            object.__setattr__(cur, "_NestedDict__index_set", None)
+            for ref in cur.__parents:
+                parent = ref()
+                if parent is not None:
+                    to_be_invalidated.append(parent)
+
     def __setitem__(self, key, value):
-        key_list = key.split(".")
+        key_list = _split_key(key)
         cur = self
-        for i in range(len(key_list)):
-            key = key_list[i]
-            if i == len(key_list) - 1:
-                dict.__setitem__(cur, key, value)
+        for i in range(len(key_list) - 1):
+            k = key_list[i]
+            if k in dict.keys(cur):
+                assert type(dict.__getitem__(cur, k)) is NestedDict
             else:
-                if key in dict.keys(cur):
-                    assert type(dict.__getitem__(cur, key)) is NestedDict
-                else:
-                    dict.__setitem__(cur, key, NestedDict())
-                cur = dict.__getitem__(cur, key)
+                child = NestedDict()
+                dict.__setitem__(cur, k, child)
+                cur.__link(child)
+            cur = dict.__getitem__(cur, k)
+
+        k = key_list[-1]
+        is_leaf = type(value) is not dict and type(value) is not NestedDict
+        old_value = dict.get(cur, k, cur)
+        dict.__setitem__(cur, k, value)
+        cur.__link(value)
+        if not (
+            is_leaf
+            and old_value is not cur
+            and type(old_value) is not dict
+            and type(old_value) is not NestedDict
+        ):
+            cur.__invalidate()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.__invalidate()
+
+    def pop(self, *args):
+        ret = dict.pop(self, *args)
+        self.__invalidate()
+        return ret
+
+    def popitem(self):
+        ret = dict.popitem(self)
+        self.__invalidate()
+        return ret
+
+    def setdefault(self, key, default=None):
+        if not dict.__contains__(self, key):
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def clear(self):
+        dict.clear(self)
+        self.__invalidate()
 
     def update(self, new_dict, prefix=None):
         for k in new_dict:
@@ -87,7 +257,26 @@ class NestedDict(dict):
             else:
                 self[key] = value
 
+    def __get_index(self):
+        if self.__index_keys is None:
+            keys = []
+            for k, v in dict.items(self):
+                if type(v) is NestedDict:
+                    keys += ["%s.%s" % (k, sub_key) for sub_key in v.__get_index()[0]]
+                elif type(v) is dict:
+                    keys += self.keys(cur=v, prefix=k)
+                else:
+                    keys.append(k)
+            object.__setattr__(self, "_NestedDict__index_keys", keys)
+            object.__setattr__(self, "_NestedDict__index_set", frozenset(keys))
+        return self.__index_keys, self.__index_set
+
+    def __contains__(self, item):
+        return dict.__contains__(self, item) or item in self.__get_index()[1]
+
     def keys(self, cur=None, prefix=None):
+        if cur is None and prefix is None:
+            return list(self.__get_index()[0])
         if cur is None:
             cur = self
 
@@ -102,7 +291,7 @@ class NestedDict(dict):
         return ret
 
     def get(self, item, default_value=None):
-        if item in self.keys():
+        if item in self.__get_index()[1]:
             return self[item]
         return default_value
 
@@ -138,6 +327,157 @@ class NestedDict(dict):
         with open(path_dump, "w", encoding="utf-8") as fout:
             json.dump(self, fout)
 
+    def freeze(self):
+        """
+        Return an immutable, hashable snapshot of the config for hot paths, see FrozenConfig. Later changes of the
+        config are not reflected in the snapshot.
+        :return: the snapshot
+        :rtype: FrozenConfig
+        """
+        return _make_frozen(tuple(dict.items(self)))
+
+
+def _freeze_value(value):
+    if type(value) is dict or type(value) is NestedDict:
+        return _make_frozen(tuple(value.items()))
+    if type(value) in [list, tuple]:
+        return tuple(_freeze_value(v) for v in value)
+    if type(value) is set:
+        return frozenset(value)
+    return value
+
+
+_frozen_classes = dict()
+
+
+def _make_frozen(items):
+    """
+    Build a FrozenConfig from (key, value) pairs. The subclass with one slot per key is generated once per key set.
+    """
+    keys = tuple(k for k, _ in items)
+    if keys not in _frozen_classes:
+        slots = tuple(
+            k
+            for k in keys
+            if isinstance(k, str)
+            and k.isidentifier()
+            and not keyword.iskeyword(k)
+            and not hasattr(FrozenConfig, k)
+        )
+        _frozen_classes[keys] = type(
+            "FrozenConfig", (FrozenConfig,), {"__slots__": slots}
+        )
+    frozen = object.__new__(_frozen_classes[keys])
+    items = tuple((k, _freeze_value(v)) for k, v in items)
+    object.__setattr__(frozen, "_FrozenConfig__items", items)
+    values = dict(items)
+    flat = dict(values)
+    for k, v in items:
+        if isinstance(v, FrozenConfig):
+            for sub_key, sub_value in v._FrozenConfig__flat.items():
+                flat["%s.%s" % (k, sub_key)] = sub_value
+    object.__setattr__(frozen, "_FrozenConfig__values", values)
+    object.__setattr__(frozen, "_FrozenConfig__flat", flat)
+    object.__setattr__(frozen, "_FrozenConfig__hash", None)
+    for k in type(frozen).__slots__:
+        object.__setattr__(frozen, k, frozen._FrozenConfig__values[k])
+    return frozen
+
+
+class FrozenConfig:
+    __slots__ = (
+        "_FrozenConfig__items",
+        "_FrozenConfig__values",
+        "_FrozenConfig__flat",
+        "_FrozenConfig__hash",
+    )
+
+    def __init__(self, *args, **kwargs):
+        """
+        An immutable snapshot of a NestedDict, returned by NestedDict.freeze() and Config.freeze(). Every key that is
+        a valid identifier is stored in a generated __slots__ attribute, so config.model.dropout is a plain slot read,
+        and every dotted key is precomputed, so config["model.dropout"] is a single dict lookup. Nested dicts are
+        frozen recursively, lists become tuples. It is hashable, comparable and pickled as its (key, value) pairs.
+
+        Examples:
+            >>> frozen = Config(default_config_dict={"model": {"dropout": 0.1}}, use_argparse=False).freeze()
+            >>> frozen.model.dropout
+            0.1
+            >>> frozen["model.dropout"]
+            0.1
+        """
+        raise TypeError("Use NestedDict.freeze() to build a FrozenConfig.")
+
+    def __setattr__(self, key, value):
+        raise TypeError("FrozenConfig is immutable.")
+
+    def __delattr__(self, key):
+        raise TypeError("FrozenConfig is immutable.")
+
+    def __getattr__(self, item):
+        if item.startswith("_FrozenConfig__"):
+            raise AttributeError(item)
+        try:
+            return self.__values[item]
+        except KeyError:
+            raise AttributeError(item)
+
+    def __getitem__(self, key):
+        return self.__flat[key]
+
+    def __contains__(self, item):
+        return item in self.__flat
+
+    def __iter__(self):
+        return iter(self.__values)
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __eq__(self, other):
+        return isinstance(other, FrozenConfig) and self.__items == other.__items
+
+    def __hash__(self):
+        if self.__hash is None:
+            object.__setattr__(self, "_FrozenConfig__hash", hash(self.__items))
+        return self.__hash
+
+    def __reduce__(self):
+        return _make_frozen, (self.__items,)
+
+    def __repr__(self):
+        return "FrozenConfig(%s)" % ", ".join("%s=%r" % kv for kv in self.__items)
+
+    def keys(self, prefix=None):
+        """
+        Return the flattened keys, like NestedDict.keys().
+        """
+        ret = []
+        for k, v in self.__items:
+            new_prefix = ".".join([prefix, k]) if prefix is not None else k
+            if isinstance(v, FrozenConfig):
+                ret += v.keys(prefix=new_prefix)
+            else:
+                ret.append(new_prefix)
+        return ret
+
+    def items(self):
+        return self.__items
+
+    def get(self, item, default_value=None):
+        return self.__flat.get(item, default_value)
+
+    def to_dict(self):
+        """
+        Return a mutable copy of the snapshot.
+        :return: config dict
+        :rtype: NestedDict
+        """
+        ret = NestedDict()
+        for k, v in self.__items:
+            ret[k] = v.to_dict() if isinstance(v, FrozenConfig) else v
+        return ret
+
 
 class Config(NestedDict):
     def __init__(
@@ -308,3 +648,36 @@ def are_configs_same(config_a, config_b, ignored_keys=("load_epoch",)):
                 return False
 
     return True
+
+
+def _canonical_value(value):
+    if hasattr(value, "tolist"):
+        value = value.tolist()
+    if type(value) in [list, tuple]:
+        return [_canonical_value(v) for v in value]
+    if type(value) is float and value.is_integer():
+        return int(value)
+    return value
+
+
+def get_config_fingerprint(config, ignored_keys=("load_epoch", "config_file")):
+    """
+    Return a canonical content hash of a config, so that finished runs can be looked up by config instead of
+    comparing against every previous config with are_configs_same. The flattened keys are sorted, lists and tuples
+    are hashed alike, and so are 1 and 1.0.
+    :param config: the config, or a dict with nested or dotted keys, e.g., the "config." fields of a record
+    :type config: NestedDict or FrozenConfig or dict
+    :param ignored_keys: the flattened keys to be ignored
+    :type ignored_keys: tuple
+    :return: the fingerprint
+    :rtype: str
+    """
+    if not isinstance(config, (NestedDict, FrozenConfig)):
+        nested = NestedDict()
+        nested.update(config)
+        config = nested
+    items = sorted(
+        [k, _canonical_value(config[k])] for k in config.keys() if k not in ignored_keys
+    )
+    content = json.dumps(items, default=str)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
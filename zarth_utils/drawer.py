@@ -1,12 +1,11 @@
 import os
 import numpy as np
 
-from matplotlib.pyplot import figure
+from .general_utils import LazyModule, get_random_time_stamp, makedir_if_not_exist
 
-from .general_utils import get_random_time_stamp, makedir_if_not_exist
+plt = LazyModule("matplotlib.pyplot")
 
 dir_figures = os.path.join(os.getcwd(), "figures")
-makedir_if_not_exist(dir_figures)
 
 
 class Drawer:
@@ -33,7 +32,7 @@ class Drawer:
         self.num_col = num_col
         unit_row_length = unit_length if unit_row_length is None else unit_row_length
         unit_col_length = unit_length if unit_col_length is None else unit_col_length
-        self.figure = figure(
+        self.figure = plt.figure(
             figsize=(num_col * unit_row_length, num_row * unit_col_length)
         )
 
@@ -200,6 +199,7 @@ class Drawer:
         """
         if fname is None:
             fname = get_random_time_stamp()
+        makedir_if_not_exist(dir_figures)
         self.figure.savefig(os.path.join(dir_figures, fname), bbox_inches="tight")
 
     def clear(self):
@@ -1,6 +1,58 @@
 import os
+import json
+import types
 import random
+import logging
 import datetime
+import importlib
+
+MANIFEST_FILENAME = "manifest.jsonl"
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name, warning=None):
+        """
+        A proxy of a module which is imported on the first attribute access, so that heavy or optional dependencies
+        do not slow down importing zarth_utils. If the import fails, the warning is logged and the error is raised.
+        Every attribute access is delegated to the module, so attributes rebound later, e.g., wandb.log after
+        wandb.init(), are always up to date.
+
+        Examples:
+            >>> torch = LazyModule("torch", "Pytorch not installed!")
+            >>> torch.zeros(3)  # torch is imported here
+
+        :param name: the full name of the module, e.g., "matplotlib.pyplot"
+        :type name: str
+        :param warning: the warning logged if the module cannot be imported
+        :type warning: str
+        """
+        super(LazyModule, self).__init__(name)
+        self.__dict__["_LazyModule__warning"] = warning
+        self.__dict__["_LazyModule__module"] = None
+
+    def __load(self):
+        module = self.__dict__["_LazyModule__module"]
+        if module is None:
+            try:
+                module = importlib.import_module(self.__name__)
+            except (ModuleNotFoundError, TypeError):
+                if self.__dict__["_LazyModule__warning"] is not None:
+                    logging.warning(self.__dict__["_LazyModule__warning"])
+                raise
+            self.__dict__["_LazyModule__module"] = module
+        return module
+
+    def __getattr__(self, item):
+        return getattr(self.__load(), item)
+
+    def __dir__(self):
+        return dir(self.__load())
+
+    def is_loaded(self):
+        """
+        Return whether the module has been imported.
+        """
+        return self.__dict__["_LazyModule__module"] is not None
 
 
 def get_datetime():
@@ -26,3 +78,47 @@ def makedir_if_not_exist(name):
         os.makedirs(name, exist_ok=True)
     except FileExistsError:
         pass
+
+
+def append_manifest(path_exp, entry):
+    """
+    Append an entry to the manifest of path_exp, which lists the runs of a sharded experiment directory (see
+    nn_utils.get_all_paths), so that they can be enumerated without walking the directory tree. The entry is written
+    in one append, so concurrent runs do not interleave.
+    :param path_exp: the path to the experiment
+    :type path_exp: str
+    :param entry: the entry, with at least "path", the path of the run relative to path_exp
+    :type entry: dict
+    """
+    line = (json.dumps(entry) + "\n").encode("utf-8")
+    fd = os.open(
+        os.path.join(path_exp, MANIFEST_FILENAME),
+        os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+        0o644,
+    )
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def read_manifest(path_exp):
+    """
+    Read the manifest of path_exp. Later entries of the same path override earlier ones.
+    :param path_exp: the path to the experiment
+    :type path_exp: str
+    :return: the entries, or None if path_exp has no manifest
+    :rtype: list
+    """
+    path_manifest = os.path.join(path_exp, MANIFEST_FILENAME)
+    if not os.path.exists(path_manifest):
+        return None
+    entries = dict()
+    with open(path_manifest, "r", encoding="utf-8") as fin:
+        for line in fin:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            entries[entry["path"]] = entry
+    return list(entries.values())
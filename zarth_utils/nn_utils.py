@@ -1,34 +1,22 @@
 import os
 import random
+import hashlib
+import datetime
 from collections import defaultdict
 
 import numpy as np
-import logging
 
-from .general_utils import makedir_if_not_exist, get_random_time_stamp
+from .general_utils import (
+    LazyModule,
+    makedir_if_not_exist,
+    get_random_time_stamp,
+    append_manifest,
+)
 from .logger import logging_info
 
-try:
-    import tensorflow as tf
-except ModuleNotFoundError as err:
-    logging.warning("Tensorflow not installed!")
-
-try:
-    import torch
-except ModuleNotFoundError as err:
-    logging.warning("Pytorch not installed!")
-
-try:
-    from sklearn.metrics import (
-        roc_auc_score,
-        confusion_matrix,
-        accuracy_score,
-        log_loss,
-        f1_score,
-        precision_score,
-    )
-except ModuleNotFoundError as err:
-    logging.warning("Scikit-learn not installed!")
+tf = LazyModule("tensorflow", "Tensorflow not installed!")
+torch = LazyModule("torch", "Pytorch not installed!")
+sklearn_metrics = LazyModule("sklearn.metrics", "Scikit-learn not installed!")
 
 
 def set_random_seed(seed, deterministic=False, no_torch=False, no_tf=True):
@@ -109,30 +97,36 @@ def get_classical_metrics(y_true, y_pred, y_prob, sample_weight=None):
         y_prob = y_prob.reshape([-1])
 
     ret = defaultdict()
-    ret["ACC"] = accuracy_score(
+    ret["ACC"] = sklearn_metrics.accuracy_score(
         y_true=y_true, y_pred=y_pred, sample_weight=sample_weight
     )
 
     if num_classes == 2:
-        ret["TNR"], ret["FPR"], ret["FNR"], ret["TPR"] = confusion_matrix(
-            y_true, y_pred, normalize="true", sample_weight=sample_weight
-        ).ravel()
-        ret["Precision"] = precision_score(y_true, y_pred, sample_weight=sample_weight)
-        ret["F1"] = f1_score(y_true=y_true, y_pred=y_pred, sample_weight=sample_weight)
+        ret["TNR"], ret["FPR"], ret["FNR"], ret["TPR"] = (
+            sklearn_metrics.confusion_matrix(
+                y_true, y_pred, normalize="true", sample_weight=sample_weight
+            ).ravel()
+        )
+        ret["Precision"] = sklearn_metrics.precision_score(
+            y_true, y_pred, sample_weight=sample_weight
+        )
+        ret["F1"] = sklearn_metrics.f1_score(
+            y_true=y_true, y_pred=y_pred, sample_weight=sample_weight
+        )
         ret["PO1"] = (y_pred == 1).sum() / len(y_pred)
 
     if len(y_prob.shape) == 2:
-        ret["Loss"] = log_loss(
+        ret["Loss"] = sklearn_metrics.log_loss(
             y_true=to_categorical(y_true), y_pred=y_prob, sample_weight=sample_weight
         )
-        ret["AUC"] = roc_auc_score(
+        ret["AUC"] = sklearn_metrics.roc_auc_score(
             y_true=to_categorical(y_true), y_score=y_prob, sample_weight=sample_weight
         )
     else:
-        ret["Loss"] = log_loss(
+        ret["Loss"] = sklearn_metrics.log_loss(
             y_true=y_true, y_pred=y_prob, sample_weight=sample_weight
         )
-        ret["AUC"] = roc_auc_score(
+        ret["AUC"] = sklearn_metrics.roc_auc_score(
             y_true=y_true, y_score=y_prob, sample_weight=sample_weight
         )
 
@@ -233,24 +227,40 @@ class EarlyStoppingManager:
         self.no_improvement = state["no_improvement"]
 
 
-def get_all_paths(path_exp, phase=None, add_time_stamp=True):
+def get_all_paths(path_exp, phase=None, add_time_stamp=True, shard=None):
     """
     :param path_exp: the path to the experiment, all files will be saved under this path
     :param phase: what you are doing right now, e.g., "train" or "eval", or you could leave it blank and a random name
     would be assigned
     :param add_time_stamp: whether add a time stamp under phase (if provided)
+    :param shard: if "hash" or "date", the files of the phase are saved under a shard directory of path_exp, named by
+    the first two hex digits of the hash of the phase or by the date, and the phase is added to the manifest of
+    path_exp, from which collect_results enumerates the runs without walking the shards
+    :type shard: str
     :return: a dict containing all paths
     """
+    assert shard in [None, "hash", "date"]
     makedir_if_not_exist(path_exp)
     if phase is None:
         phase = get_random_time_stamp()
     elif add_time_stamp:
         phase = "-".join([phase, get_random_time_stamp()])
 
+    path_phase = phase
+    if shard is not None:
+        if shard == "hash":
+            dir_shard = hashlib.sha1(phase.encode("utf-8")).hexdigest()[:2]
+        else:
+            dir_shard = datetime.date.today().strftime("%Y-%m-%d")
+        makedir_if_not_exist(os.path.join(path_exp, dir_shard))
+        path_phase = "/".join([dir_shard, phase])
+        append_manifest(path_exp, {"path": path_phase, "shard": dir_shard})
+    path_phase = os.path.join(path_exp, *path_phase.split("/"))
+
     return {
-        "path_record": os.path.join(path_exp, phase),
-        "path_config": os.path.join(path_exp, phase),
-        "path_log": os.path.join(path_exp, phase),
+        "path_record": path_phase,
+        "path_config": path_phase,
+        "path_log": path_phase,
         "path_best_ckpt": os.path.join(path_exp, "best_ckpt"),
         "path_ckpt": os.path.join(path_exp, "ckpt_%d"),
     }
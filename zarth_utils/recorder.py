@@ -1,84 +1,686 @@
+import io
 import os
 import sys
 import json
+import atexit
+import hashlib
 import logging
+import math
 import platform
+import queue
 import shutil
 import stat
+import threading
+import time
+import weakref
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from json import JSONDecodeError
 
-import git
-import joblib
 import numpy as np
-import pandas as pd
-from tqdm import tqdm
 
-from .config import Config
-from .general_utils import get_random_time_stamp, get_datetime
+from .config import Config, NestedDict, get_config_fingerprint
+from .general_utils import (
+    LazyModule,
+    get_random_time_stamp,
+    get_datetime,
+    makedir_if_not_exist,
+    read_manifest,
+)
 from .logger import logging_info
+from .result_archive import PACK_SUFFIX, get_pack, open_record, split_pack_path
+from .result_cache import ResultCache
 
-try:
-    import wandb
-except ModuleNotFoundError as err:
-    logging.warning("WandB not installed!")
-except TypeError as err:
-    logging.warning("WandB not properly installed!")
+git = LazyModule("git")
+joblib = LazyModule("joblib")
+pd = LazyModule("pandas")
+tqdm = LazyModule("tqdm")
+wandb = LazyModule("wandb", "WandB not installed!")
+
+
+METRIC_SIGNAL = "$METRIC$"
+SUMMARY_SIGNAL = "$SUMMARY$"
+OFFSETS_SIGNAL = "$OFFSETS$"
+FOOTER_SIGNAL = "$FOOTER$"
+ARRAY_SIGNAL = "$ARRAY$"
+FOOTER_LENGTH = len("%s %020d %020d\n" % (FOOTER_SIGNAL, 0, 0))
+
+
+def get_metric_key(key, epoch=None, step=None):
+    """
+    Return the flat key used by the recorded results for a metric, e.g., "epoch_3-step_120-loss".
+    :param key: the metric name
+    :type key: str
+    :param epoch: the epoch, ignored if None
+    :param step: the step, ignored if None
+    :return: the flat key
+    :rtype: str
+    """
+    if step is not None:
+        key = "step_%d-%s" % (step, key)
+    if epoch is not None:
+        key = "epoch_%d-%s" % (epoch, key)
+    return key
+
+
+def save_array(value, path_arrays):
+    """
+    Append the raw bytes of an array to the binary sidecar path_arrays, and return the pointer stored in the record.
+    :param value: the array
+    :type value: np.ndarray
+    :param path_arrays: the path of the sidecar
+    :type path_arrays: str
+    :return: the JSON pointer, {"$ARRAY$": {"file": ..., "offset": ..., "dtype": ..., "shape": ...}}
+    :rtype: dict
+    """
+    value = np.ascontiguousarray(value)
+    with open(path_arrays, "ab") as fout:
+        offset = fout.tell()
+        fout.write(value.tobytes())
+    return {
+        ARRAY_SIGNAL: {
+            "file": os.path.basename(path_arrays),
+            "offset": offset,
+            "dtype": value.dtype.str,
+            "shape": list(value.shape),
+        }
+    }
+
+
+def load_array(pointer, dir_record):
+    """
+    Load an array saved by save_array as a read-only memory map.
+    :param pointer: the JSON pointer returned by save_array
+    :type pointer: dict
+    :param dir_record: the directory of the record, where the sidecar is
+    :type dir_record: str
+    :return: the array
+    :rtype: np.ndarray
+    """
+    pointer = pointer[ARRAY_SIGNAL]
+    path_arrays = os.path.join(dir_record, pointer["file"])
+    offset = pointer["offset"]
+    path_pack, member = split_pack_path(path_arrays)
+    if path_pack is not None:
+        path_arrays = path_pack
+        offset += get_pack(path_pack).get_raw_offset(member)
+    dtype, shape = np.dtype(pointer["dtype"]), tuple(pointer["shape"])
+    if len(shape) == 0 or 0 in shape:
+        count = int(np.prod(shape))
+        return np.fromfile(
+            path_arrays, dtype=dtype, count=count, offset=offset
+        ).reshape(shape)
+    return np.memmap(path_arrays, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+
+def load_arrays(line, dir_record):
+    """
+    Replace the array pointers among the values of line with the arrays, see load_array.
+    :param line: the flat key-value pairs
+    :type line: dict
+    :param dir_record: the directory of the record
+    :type dir_record: str
+    :return: line
+    :rtype: dict
+    """
+    for k, v in line.items():
+        if type(v) is dict and ARRAY_SIGNAL in v:
+            line[k] = load_array(v, dir_record)
+    return line
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("%s is not JSON serializable" % type(value).__name__)
+
+
+def parse_metric_key(key):
+    """
+    Split a flat key into the metric name, epoch and step, e.g., "epoch_3-step_120-loss" -> ("loss", 3, 120).
+    :param key: the flat key
+    :type key: str
+    :return: the metric name, the epoch or None, the step or None
+    :rtype: tuple
+    """
+    epoch, step = None, None
+    for prefix in ["epoch_", "step_"]:
+        if key.startswith(prefix) and "-" in key:
+            head, rest = key.split("-", 1)
+            try:
+                value = int(head[len(prefix) :])
+            except ValueError:
+                break
+            if prefix == "epoch_":
+                epoch = value
+            else:
+                step = value
+            key = rest
+    return key, epoch, step
+
+
+class MetricSeries:
+    def __init__(self, name):
+        """
+        The array-backed records of one metric. Missing epochs or steps are stored as -1. Values are stored as
+        float64 as long as all of them are numbers, otherwise they fall back to a list.
+        :param name: the metric name
+        :type name: str
+        """
+        self.name = name
+        self.epochs = array("q")
+        self.steps = array("q")
+        self.times = array("d")
+        self.values = array("d")
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, epoch, step, wall_time, value):
+        """
+        Append one record to the series.
+        :param epoch: the epoch, could be None
+        :param step: the step, could be None
+        :param wall_time: the wall time when the value is recorded
+        :type wall_time: float
+        :param value: the value
+        """
+        if type(self.values) is array:
+            if isinstance(value, (bool, int, float)):
+                value = float(value)
+            else:
+                self.values = list(self.values)
+        self.epochs.append(-1 if epoch is None else epoch)
+        self.steps.append(-1 if step is None else step)
+        self.times.append(wall_time)
+        self.values.append(value)
+
+    def to_numpy(self):
+        """
+        Return the series as numpy arrays. The numeric buffers are copied in bulk, so the series can still grow.
+        :return: epochs, steps, times, values
+        :rtype: tuple
+        """
+        if type(self.values) is array:
+            values = np.array(self.values, dtype=np.float64)
+        else:
+            values = np.asarray(self.values, dtype=object)
+        return (
+            np.array(self.epochs, dtype=np.int64),
+            np.array(self.steps, dtype=np.int64),
+            np.array(self.times, dtype=np.float64),
+            values,
+        )
+
+    def get_trajectory(self, by="epoch"):
+        """
+        Return the trajectory of the metric, ordered by epoch or step.
+        :param by: "epoch" or "step"
+        :type by: str
+        :return: x, y
+        :rtype: np.ndarray, np.ndarray
+        """
+        epochs, steps, _, values = self.to_numpy()
+        if by == "epoch":
+            x = epochs
+        elif by == "step":
+            x = steps
+        else:
+            raise NotImplementedError
+        order = np.argsort(x, kind="stable")
+        return x[order], values[order]
+
+    def items(self):
+        """
+        Iterate over the records as (flat key, value) pairs.
+        """
+        for epoch, step, value in zip(self.epochs, self.steps, self.values):
+            yield get_metric_key(
+                self.name, None if epoch < 0 else epoch, None if step < 0 else step
+            ), value
+
+
+class BufferedRecordWriter:
+    FSYNC_POLICIES = ("never", "flush", "close")
+
+    def __init__(self, path_file, flush_every=100, flush_interval=1.0, fsync="close"):
+        """
+        Keep one handle of path_file open and append the buffered lines from a background thread. The buffer is
+        flushed once flush_every lines are pending or flush_interval seconds have passed, whichever comes first, so a
+        crash loses at most one flush window. The writer is also closed (and thus flushed) at interpreter exit.
+        :param path_file: the file to append to
+        :type path_file: str
+        :param flush_every: flush once this number of lines are buffered
+        :type flush_every: int
+        :param flush_interval: flush at least once every flush_interval seconds
+        :type flush_interval: float
+        :param fsync: "never" leaves syncing to the OS, "flush" fsyncs after every flush, "close" fsyncs only on close
+        :type fsync: str
+        """
+        assert fsync in self.FSYNC_POLICIES, "Unknown fsync policy: %s" % fsync
+        self.path_file = path_file
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self.__buffer = []
+        self.__closed = False
+        self.__condition = threading.Condition()
+        self.__io_lock = threading.Lock()
+        self.__fout = open(path_file, "a", encoding="utf-8")
+
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+        atexit.register(self.close)
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                if not self.__closed and len(self.__buffer) < self.flush_every:
+                    self.__condition.wait(self.flush_interval)
+                if self.__closed:
+                    return
+            self.flush()
+
+    def write(self, line):
+        """
+        Buffer a line, which will be appended to the file by the next flush.
+        :param line: the content to be write
+        :type line: str
+        """
+        with self.__condition:
+            assert not self.__closed
+            self.__buffer.append(line + "\n")
+            if len(self.__buffer) >= self.flush_every:
+                self.__condition.notify()
+
+    def flush(self, fsync=None):
+        """
+        Write all the buffered lines into the file.
+        :param fsync: whether fsync after writing, follow the fsync policy if None, which only fsyncs if some lines
+        are written, so that an idle writer does not fsync every flush_interval
+        :type fsync: bool
+        """
+        with self.__io_lock:
+            with self.__condition:
+                lines, self.__buffer = self.__buffer, []
+            if self.__fout.closed:
+                return
+            if fsync is None:
+                fsync = self.fsync == "flush" and len(lines) != 0
+            if len(lines) != 0:
+                self.__fout.write("".join(lines))
+                self.__fout.flush()
+            if fsync:
+                os.fsync(self.__fout.fileno())
+
+    def close(self):
+        """
+        Stop the background thread, flush everything left and close the file. Calling it twice is harmless.
+        """
+        with self.__condition:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__condition.notify()
+        if self.__thread is not threading.current_thread():
+            self.__thread.join()
+        self.flush(fsync=self.fsync != "never")
+        self.__fout.close()
+        atexit.unregister(self.close)
+
+
+class KeyHashSet:
+    def __init__(self, min_buffer_size=1 << 16):
+        """
+        A compact set of strings, storing the 8-byte hash of each key: recent hashes are kept in a set, which is
+        merged into a sorted uint64 array once it grows beyond 1/8 of the array, so a key costs about 8 bytes and
+        both adding and looking up stay cheap. Two keys are only confused if their 64-bit hashes collide.
+        :param min_buffer_size: the minimal size of the set before merging
+        :type min_buffer_size: int
+        """
+        self.min_buffer_size = min_buffer_size
+        self.hashes = np.zeros(0, dtype=np.uint64)
+        self.buffer = set()
+
+    @staticmethod
+    def __hash(key):
+        return int.from_bytes(
+            hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little"
+        )
+
+    def __len__(self):
+        return len(self.hashes) + len(self.buffer)
+
+    def add(self, key):
+        self.buffer.add(self.__hash(key))
+        if len(self.buffer) > max(self.min_buffer_size, len(self.hashes) // 8):
+            buffer = np.fromiter(self.buffer, dtype=np.uint64, count=len(self.buffer))
+            self.hashes = np.union1d(self.hashes, buffer)
+            self.buffer = set()
+
+    def __contains__(self, key):
+        h = self.__hash(key)
+        if h in self.buffer:
+            return True
+        i = np.searchsorted(self.hashes, np.uint64(h))
+        return bool(i < len(self.hashes) and self.hashes[i] == h)
+
+
+_platform_metadata = None
+
+
+def get_platform_metadata():
+    """
+    Return the platform information recorded in meta_data, which is only captured once per interpreter.
+    :return: the platform information
+    :rtype: dict
+    """
+    global _platform_metadata
+    if _platform_metadata is None:
+        _platform_metadata = {
+            "operating_system": platform.system(),
+            "os_release": platform.release(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+        }
+    return dict(_platform_metadata)
+
+
+def get_git_commit(path_repo, allow_dirty=False):
+    """
+    Return the commit hash of the git repo at path_repo.
+    :param path_repo: the path of the repo
+    :type path_repo: str
+    :param allow_dirty: if False, the repo must not be dirty
+    :type allow_dirty: bool
+    :return: the commit hash
+    :rtype: str
+    """
+    repo = git.Repo(path=path_repo)
+    commit = repo.head.object.hexsha
+    if not allow_dirty:
+        assert not repo.is_dirty()
+    return commit
+
+
+def export_conda_environment(path_requirement, dir_cache=None):
+    """
+    Export the current conda environment into path_requirement. If dir_cache is given, the export is cached there,
+    keyed by the environment prefix and the modification time of its conda-meta directory, so it only runs again
+    after packages are installed or removed.
+    :param path_requirement: the path of the exported environment file
+    :type path_requirement: str
+    :param dir_cache: the directory of the cached exports, no cache if None
+    :type dir_cache: str
+    """
+    dir_conda = os.path.dirname(
+        os.path.dirname(os.path.dirname(os.path.dirname(sys.executable)))
+    )
+    path_conda = os.path.join(dir_conda, "condabin", "conda")
+    if dir_cache is None:
+        os.system("%s env export --file %s" % (path_conda, path_requirement))
+        return
+
+    path_conda_meta = os.path.join(sys.prefix, "conda-meta")
+    version = (
+        os.stat(path_conda_meta).st_mtime_ns if os.path.exists(path_conda_meta) else 0
+    )
+    key = hashlib.sha1(("%s-%d" % (sys.prefix, version)).encode()).hexdigest()
+    path_cached = os.path.join(dir_cache, "%s.env.yml" % key)
+    if not os.path.exists(path_cached):
+        makedir_if_not_exist(dir_cache)
+        path_cached_temp = "%s.%s.temp" % (path_cached, get_random_time_stamp())
+        os.system("%s env export --file %s" % (path_conda, path_cached_temp))
+        if not os.path.exists(path_cached_temp):
+            return
+        os.replace(path_cached_temp, path_cached)
+    shutil.copy(path_cached, path_requirement)
 
 
 class Recorder:
-    def __init__(self, path_record, config=None, use_git=True, use_wandb=False):
+    def __init__(
+        self,
+        path_record,
+        config=None,
+        use_git=True,
+        use_wandb=False,
+        buffered=False,
+        flush_every=100,
+        flush_interval=1.0,
+        fsync="close",
+        structured_metrics=False,
+        async_metadata=False,
+        env_cache_dir=None,
+        batch_metrics=False,
+        background_commit=False,
+        bounded_memory=False,
+        resume=False,
+        skip_recorded=False,
+    ):
         """
         Initialize the result recorder. The results will be saved in a temporary file defined by path_record.temp.
         To end recording and transfer the temporary files, self.end_recording() must be called.
         :param path_record: the saving path of the recorded results.
         :type path_record: str
         :param config: a record to be initialize with, usually the config in practice
+        :param buffered: whether keep the record file open and flush it from a background thread, instead of opening
+        and closing it for every single key
+        :type buffered: bool
+        :param flush_every: for buffered mode, flush once this number of records are pending
+        :type flush_every: int
+        :param flush_interval: for buffered mode, flush at least once every flush_interval seconds
+        :type flush_interval: float
+        :param fsync: for buffered mode, the fsync policy, see BufferedRecordWriter
+        :type fsync: str
+        :param structured_metrics: whether store the metrics given to add() as (key, epoch, step, time, value) records
+        in array-backed MetricSeries, instead of encoding epoch and step into the keys
+        :type structured_metrics: bool
+        :param async_metadata: whether capture the platform and git meta_data and export the conda environment in a
+        background thread. They are filled in when ready and end_recording() waits for them. If capturing fails, e.g.,
+        the git repo is dirty, the error is raised by the next add() or item setting, or by end_recording() after the
+        record is ended with the error in meta_data.metadata_error.
+        :type async_metadata: bool
+        :param env_cache_dir: the directory caching the conda environment exports across runs, see
+        export_conda_environment
+        :type env_cache_dir: str
+        :param batch_metrics: whether accumulate the metrics of the same epoch/step and emit them at once, see
+        commit(). W&B then receives one wandb.log call per epoch/step, with bare metric names plus "epoch" and
+        "step", and an explicit step counting the commits.
+        :type batch_metrics: bool
+        :param background_commit: for batched mode, whether emit the committed batches from a background thread
+        :type background_commit: bool
+        :param bounded_memory: whether only keep the config, the meta_data and the latest and aggregated values of each
+        metric in memory, with the full history read back from the record file when needed. Duplicated keys are then
+        detected with a KeyHashSet, without reading the history back.
+        :type bounded_memory: bool
+        :param resume: whether resume from an existing temporary record at the same path, e.g., after preemption. The
+        record is truncated to its last complete line, its config must be the same as config, and its keys are loaded
+        so that recording continues in the same file.
+        :type resume: bool
+        :param skip_recorded: whether add() skips the metrics whose keys are already recorded, instead of raising an
+        AssertionError. It is meant for resume, where the run usually restarts from a checkpoint older than the last
+        logged step, and the metrics logged after the checkpoint are then kept as they are in the record.
+        :type skip_recorded: bool
         """
+        self.__lock = threading.RLock()
+        self.__metadata_thread = None
+        self.__metadata_error = None
         self.__ending = False
         self.__record = dict()
+        self.__metrics = dict()
+        self.__metric_index = dict()
         self.use_wandb = use_wandb
+        self.structured_metrics = structured_metrics
+        self.skip_recorded = skip_recorded
+
+        self.bounded_memory = bounded_memory
+        self.__key_hashes = KeyHashSet() if bounded_memory else None
+        self.__latest = dict()
+        self.__aggregates = dict()
+
+        self.batch_metrics = batch_metrics
+        self.__batch_index = None
+        self.__batch_lines = []
+        self.__batch_values = dict()
+        self.__wandb_step = 0
+        self.__commit_queue = None
+        self.__commit_thread = None
+        if batch_metrics and background_commit:
+            self.__commit_queue = queue.Queue()
+            self.__commit_thread = threading.Thread(
+                target=self.__run_commit_queue, daemon=True
+            )
+            self.__commit_thread.start()
 
         self.path_temp_record = "%s.result.temp" % path_record
         self.path_record = "%s.result" % path_record
+        self.path_arrays = "%s.arrays" % path_record
+        self.writer = None
+        self.__replaying = False
 
-        if os.path.exists(self.path_temp_record):
+        resumed = resume and os.path.exists(self.path_temp_record)
+        time_stamp = get_random_time_stamp()
+        if resumed:
+            self.__resume(config)
+        elif os.path.exists(self.path_temp_record):
             shutil.move(
-                self.path_temp_record,
-                self.path_temp_record + ".mv.%s" % get_random_time_stamp(),
+                self.path_temp_record, self.path_temp_record + ".mv.%s" % time_stamp
             )
         if os.path.exists(self.path_record):
-            shutil.move(
-                self.path_record, self.path_record + ".mv.%s" % get_random_time_stamp()
+            shutil.move(self.path_record, self.path_record + ".mv.%s" % time_stamp)
+        if not resumed and os.path.exists(self.path_arrays):
+            # the sidecar belongs to the records moved aside
+            shutil.move(self.path_arrays, self.path_arrays + ".mv.%s" % time_stamp)
+        if buffered:
+            self.writer = BufferedRecordWriter(
+                self.path_temp_record,
+                flush_every=flush_every,
+                flush_interval=flush_interval,
+                fsync=fsync,
             )
 
-        if config is not None:
+        if config is not None and not resumed:
             for k in config.keys():
                 self.__setitem__("config." + k, config[k])
 
-        self.__setitem__("meta_data.operating_system", platform.system())
-        self.__setitem__("meta_data.os_release", platform.release())
-        self.__setitem__("meta_data.platform", platform.platform())
-        self.__setitem__("meta_data.processor", platform.processor())
-        self.__setitem__("meta_data.args", " ".join(sys.argv))
-        self.__setitem__("meta_data.run_dir", os.getcwd())
-        self.__setitem__("meta_data.start_time", get_datetime())
-
-        if use_git:
-            repo = git.Repo(path=os.getcwd())
-            assert not repo.is_dirty()
-            self.__setitem__("meta_data." + "git_commit", repo.head.object.hexsha)
+        self.__set_meta_data("args", " ".join(sys.argv))
+        self.__set_meta_data("run_dir", os.getcwd())
+        self.__set_meta_data("start_time", get_datetime())
+        if resumed:
+            num_resumes = len(
+                [k for k in self.keys() if k.startswith("meta_data.resume_time_")]
+            )
+            self.__setitem__("meta_data.resume_time_%d" % num_resumes, get_datetime())
 
         self.path_requirement = "%s.env.yml" % path_record
-        if os.path.exists(self.path_requirement):
+        use_conda = not (resumed and os.path.exists(self.path_requirement))
+        if use_conda and os.path.exists(self.path_requirement):
             shutil.move(
                 self.path_requirement,
                 self.path_requirement + ".mv.%s" % get_random_time_stamp(),
             )
-        dir_conda = os.path.dirname(
-            os.path.dirname(os.path.dirname(os.path.dirname(sys.executable)))
-        )
-        path_conda = os.path.join(dir_conda, "condabin", "conda")
-        os.system("%s env export --file %s" % (path_conda, self.path_requirement))
+
+        if async_metadata:
+            self.__metadata_thread = threading.Thread(
+                target=self.__capture_metadata,
+                args=(use_git, use_conda, env_cache_dir, os.getcwd()),
+                daemon=True,
+            )
+            self.__metadata_thread.start()
+        else:
+            self.__capture_metadata(
+                use_git, use_conda, env_cache_dir, os.getcwd(), False
+            )
+
+    def __resume(self, config):
+        """
+        Truncate the temporary record to its last complete line, validate its config and load its keys.
+        """
+        valid_length = 0
+        with open(self.path_temp_record, "rb") as fin:
+            for line in fin:
+                if not line.endswith(b"\n") or line.strip() == b"$END$":
+                    break
+                if len(line.strip()) != 0:
+                    try:
+                        json.loads(line)
+                    except JSONDecodeError:
+                        break
+                valid_length += len(line)
+        with open(self.path_temp_record, "r+b") as fout:
+            fout.truncate(valid_length)
+
+        existing_config = dict()
+        self.__replaying = True
+        with open(self.path_temp_record, "rb") as fin:
+            for _, line in _iter_record_lines(fin):
+                if METRIC_SIGNAL in line:
+                    metric = line[METRIC_SIGNAL]
+                    self.__set_metric(
+                        metric["key"],
+                        metric["value"],
+                        metric["epoch"],
+                        metric["step"],
+                        metric["time"],
+                    )
+                    continue
+                for k, v in line.items():
+                    self.__set_record(k, v)
+                    if k.startswith("config."):
+                        existing_config[k[len("config.") :]] = v
+        self.__replaying = False
+
+        if config is not None:
+            new_config = {k: config[k] for k in config.keys()}
+            assert json.dumps(existing_config, sort_keys=True) == json.dumps(
+                new_config, sort_keys=True
+            ), ("Cannot resume %s with a different config!" % self.path_temp_record)
+
+    def __set_meta_data(self, key, value):
+        """
+        Set meta_data.key = value, unless it is already loaded from a resumed record.
+        """
+        key = "meta_data." + key
+        with self.__lock:
+            if key in self.__record:
+                if self.__record[key] != value:
+                    logging.warning(
+                        "Resumed %s: %s (Existing) - %s (New)"
+                        % (key, str(self.__record[key]), str(value))
+                    )
+                return
+            self.__setitem__(key, value)
+
+    def __capture_metadata(
+        self, use_git, use_conda, env_cache_dir, run_dir, catch_error=True
+    ):
+        try:
+            for k, v in get_platform_metadata().items():
+                self.__set_meta_data(k, v)
+            if use_git:
+                self.__set_meta_data("git_commit", get_git_commit(run_dir))
+            if use_conda:
+                export_conda_environment(self.path_requirement, env_cache_dir)
+        except Exception as err:
+            if not catch_error:
+                raise
+            self.__metadata_error = err
+
+    def wait_metadata(self):
+        """
+        Wait for the meta_data captured in the background (see async_metadata), and raise its error if any.
+        """
+        if self.__metadata_thread is not None:
+            self.__metadata_thread.join()
+        self.__check_metadata()
+
+    def __check_metadata(self):
+        if self.__metadata_error is not None:
+            raise self.__metadata_error
 
     def write_record(self, line):
         """
@@ -86,11 +688,34 @@ class Recorder:
         :param line: the content to be write
         :type line: str
         """
-        with open(self.path_temp_record, "a", encoding="utf-8") as fin:
-            fin.write(line + "\n")
+        if self.writer is not None:
+            self.writer.write(line)
+            return
+        with self.__lock:
+            with open(self.path_temp_record, "a", encoding="utf-8") as fin:
+                fin.write(line + "\n")
+
+    def flush(self):
+        """
+        Force the buffered records, and the committed batches still waiting for the background commit thread, to be
+        written into the temporary file.
+        """
+        if self.__commit_queue is not None:
+            self.__commit_queue.join()
+        if self.writer is not None:
+            self.writer.flush()
 
     def keys(self):
-        return self.__record.keys()
+        """
+        Return the recorded keys, with the structured metrics given as flat keys, e.g., "epoch_0-loss". In
+        bounded_memory mode, only the keys kept in memory, i.e., the config and the meta_data, are returned, see
+        iter_records() for all.
+        """
+        if len(self.__metric_index) == 0:
+            return self.__record.keys()
+        ret = list(self.__record.keys())
+        ret.extend(get_metric_key(*index) for index in self.__metric_index)
+        return ret
 
     def __getitem__(self, key):
         """
@@ -99,26 +724,255 @@ class Recorder:
         :type key:
         :return: results[key]
         """
+        if self.bounded_memory and key not in self.__record:
+            for k, v in self.iter_records():
+                if k == key:
+                    return v
+        if key not in self.__record and len(self.__metric_index) != 0:
+            name, epoch, step = parse_metric_key(key)
+            position = self.__metric_index.get((name, epoch, step))
+            if position is not None:
+                return self.__metrics[name].values[position]
         return self.__record[key]
 
+    def iter_records(self):
+        """
+        Stream all the recorded (key, value) pairs from the record file, including the pending ones in batched mode.
+        """
+        self.flush()
+        path_file = self.path_record if self.__ending else self.path_temp_record
+        if os.path.exists(path_file):
+            with open(path_file, "rb") as fin:
+                for _, line in _iter_record_lines(fin):
+                    yield from load_arrays(
+                        expand_record_line(line), os.path.dirname(path_file)
+                    ).items()
+        with self.__lock:
+            lines = list(self.__batch_lines)
+        for line in lines:
+            yield from load_arrays(
+                expand_record_line(json.loads(line)), os.path.dirname(path_file)
+            ).items()
+
+    def __is_metric_key(self, key):
+        return self.bounded_memory and not (
+            key.startswith("config.") or key.startswith("meta_data.")
+        )
+
+    def __add_metric_key(self, key, value):
+        """
+        Track a metric key in bounded_memory mode: check duplication and update the latest and aggregated values.
+        """
+        assert self.__replaying or key not in self.__key_hashes
+        self.__key_hashes.add(key)
+        name = parse_metric_key(key)[0]
+        self.__latest[name] = value
+        if isinstance(value, (bool, int, float)):
+            if name not in self.__aggregates:
+                self.__aggregates[name] = {
+                    "count": 0,
+                    "sum": 0.0,
+                    "min": math.inf,
+                    "max": -math.inf,
+                }
+            aggregate = self.__aggregates[name]
+            aggregate["count"] += 1
+            aggregate["sum"] += value
+            aggregate["min"] = min(aggregate["min"], value)
+            aggregate["max"] = max(aggregate["max"], value)
+
+    def get_latest(self, key):
+        """
+        Return the latest value of a metric, available in bounded_memory mode.
+        :param key: the metric name
+        """
+        return self.__latest[key]
+
+    def get_aggregate(self, key):
+        """
+        Return the aggregated values of a numeric metric, available in bounded_memory mode.
+        :param key: the metric name
+        :return: count, mean, min and max of the values
+        :rtype: dict
+        """
+        aggregate = dict(self.__aggregates[key])
+        aggregate["mean"] = aggregate.pop("sum") / aggregate["count"]
+        return aggregate
+
     def __setitem__(self, key, value):
         """
         Set result[key] = value
         """
-        assert not self.__ending
-        assert key not in self.__record.keys()
-        self.__record[key] = value
-        self.write_record(json.dumps({key: value}))
+        if threading.current_thread() is not self.__metadata_thread:
+            self.__check_metadata()
+        with self.__lock:
+            self.write_record(self.__set_record(key, value))
+
+    def __set_record(self, key, value):
+        with self.__lock:
+            assert not self.__ending
+            if self.__is_metric_key(key):
+                self.__add_metric_key(key, value)
+            else:
+                assert key not in self.__record.keys()
+                # the flat key of a structured metric is taken as well
+                assert parse_metric_key(key) not in self.__metric_index
+                self.__record[key] = value
+        return json.dumps({key: self.__encode_value(value)})
+
+    def __encode_value(self, value):
+        """
+        Make value JSON serializable: numpy scalars are converted to python scalars and numpy arrays are saved into the
+        binary sidecar path_arrays, with a pointer stored in the record instead.
+        """
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, np.ndarray):
+            if value.dtype.hasobject:
+                return value.tolist()
+            with self.__lock:
+                return save_array(value, self.path_arrays)
+        return value
+
+    def __emit(self, key, flat_key, value, line, epoch, step):
+        if not self.batch_metrics:
+            if self.use_wandb:
+                wandb.log({flat_key if not self.structured_metrics else key: value})
+            self.write_record(line)
+            return
+        with self.__lock:
+            if (epoch, step) != self.__batch_index:
+                self.commit()
+            self.__batch_index = (epoch, step)
+            self.__batch_lines.append(line)
+            self.__batch_values[key] = value
+
+    def __is_recorded(self, key, epoch, step):
+        flat_key = get_metric_key(key, epoch, step)
+        with self.__lock:
+            if self.bounded_memory:
+                return flat_key in self.__key_hashes
+            return (
+                flat_key in self.__record or (key, epoch, step) in self.__metric_index
+            )
 
     def add(self, key, value, epoch=None, step=None):
-        if step is not None:
-            key = "step_%d-%s" % (step, key)
-        if epoch is not None:
-            key = "epoch_%d-%s" % (epoch, key)
+        self.__check_metadata()
+        if self.skip_recorded and self.__is_recorded(key, epoch, step):
+            return get_metric_key(key, epoch, step), value
+        if self.structured_metrics:
+            return self.add_metric(key, value, epoch, step)
+        flat_key = get_metric_key(key, epoch, step)
+        line = self.__set_record(flat_key, value)
+        self.__emit(key, flat_key, value, line, epoch, step)
+        return flat_key, value
+
+    def add_metric(self, key, value, epoch=None, step=None):
+        """
+        Add a structured metric record, which keeps the metric name, epoch, step, wall time and value as separate
+        fields.
+        :param key: the metric name
+        :param value: the value to be added
+        :param epoch: current epoch
+        :param step: current step
+        :return: the flat key and the value
+        """
+        self.__check_metadata()
+        wall_time = time.time()
+        self.__set_metric(key, value, epoch, step, wall_time)
+        line = json.dumps(
+            {
+                METRIC_SIGNAL: {
+                    "key": key,
+                    "epoch": epoch,
+                    "step": step,
+                    "time": wall_time,
+                    "value": self.__encode_value(value),
+                }
+            }
+        )
+        flat_key = get_metric_key(key, epoch, step)
+        self.__emit(key, flat_key, value, line, epoch, step)
+        return flat_key, value
+
+    def __set_metric(self, key, value, epoch, step, wall_time):
+        with self.__lock:
+            assert not self.__ending
+            if self.bounded_memory:
+                self.__add_metric_key(get_metric_key(key, epoch, step), value)
+            else:
+                index = (key, epoch, step)
+                assert index not in self.__metric_index
+                assert get_metric_key(key, epoch, step) not in self.__record
+                if key not in self.__metrics:
+                    self.__metrics[key] = MetricSeries(key)
+                self.__metric_index[index] = len(self.__metrics[key])
+                self.__metrics[key].append(epoch, step, wall_time, value)
+
+    def commit(self):
+        """
+        Emit the pending metrics of the current epoch/step in batched mode: one wandb.log call with an explicit step,
+        and one write to the record file. It is called automatically when add() moves to another epoch/step, and by
+        end_recording().
+        """
+        with self.__lock:
+            lines, values = self.__batch_lines, self.__batch_values
+            self.__batch_lines, self.__batch_values = [], dict()
+            if len(lines) == 0:
+                return
+            epoch, step = self.__batch_index
+            if epoch is not None:
+                values["epoch"] = epoch
+            if step is not None:
+                values["step"] = step
+            wandb_step = self.__wandb_step
+            self.__wandb_step += 1
+            if self.__commit_queue is not None:
+                self.__commit_queue.put((values, wandb_step, lines))
+                return
+        self.__write_batch(values, wandb_step, lines)
+
+    def __write_batch(self, values, wandb_step, lines):
         if self.use_wandb:
-            wandb.log({key: value})
-        self.__setitem__(key, value)
-        return key, value
+            wandb.log(values, step=wandb_step)
+        self.write_record("\n".join(lines))
+
+    def __run_commit_queue(self):
+        while True:
+            batch = self.__commit_queue.get()
+            try:
+                if batch is None:
+                    return
+                self.__write_batch(*batch)
+            finally:
+                self.__commit_queue.task_done()
+
+    def get_metric(self, key):
+        """
+        Return the structured records of a metric.
+        :param key: the metric name
+        :return: the series
+        :rtype: MetricSeries
+        """
+        return self.__metrics[key]
+
+    def get_metrics(self):
+        """
+        Return all the structured metric records.
+        :return: metric name -> series
+        :rtype: dict
+        """
+        return self.__metrics
+
+    def get_trajectory(self, key, by="epoch"):
+        """
+        Return the trajectory of a structured metric.
+        :param key: the metric name
+        :param by: "epoch" or "step"
+        :return: x, y
+        :rtype: np.ndarray, np.ndarray
+        """
+        return self.__metrics[key].get_trajectory(by=by)
 
     def add_with_logging(self, key, value, msg=None, epoch=None, step=None):
         """
@@ -148,17 +1002,31 @@ class Recorder:
         :return:
         :rtype:
         """
+        if self.__metadata_thread is not None:
+            self.__metadata_thread.join()
+        metadata_error, self.__metadata_error = self.__metadata_error, None
+        self.commit()
+        if self.__commit_thread is not None:
+            self.__commit_queue.put(None)
+            self.__commit_thread.join()
         assert "meta_data.end_time" not in self.keys()
+        if metadata_error is not None:
+            self.__setitem__("meta_data.metadata_error", repr(metadata_error))
         self.__setitem__("meta_data.end_time", get_datetime())
         self.__ending = True
         self.write_record("\n$END$\n")
+        if self.writer is not None:
+            self.writer.close()
+        write_result_summary(self.path_temp_record)
 
         shutil.move(self.path_temp_record, self.path_record)
         os.chmod(self.path_record, stat.S_IREAD)
+        if metadata_error is not None:
+            raise metadata_error
 
     def dump(self, path_dump):
         """
-        Dump the result record in the path_dump.
+        Dump the result record in the path_dump, together with its array sidecar, if any.
         :param path_dump: the path to dump the result record
         :type path_dump: str
         """
@@ -167,6 +1035,15 @@ class Recorder:
             "%s.result" % path_dump if not path_dump.endswith(".result") else path_dump
         )
         assert not os.path.exists(path_dump)
+        # the array pointers refer to the sidecar by its file name in the directory of the record
+        path_arrays_dump = os.path.join(
+            os.path.dirname(path_dump), os.path.basename(self.path_arrays)
+        )
+        if os.path.exists(self.path_arrays) and os.path.abspath(
+            path_arrays_dump
+        ) != os.path.abspath(self.path_arrays):
+            assert not os.path.exists(path_arrays_dump)
+            shutil.copy(self.path_arrays, path_arrays_dump)
         shutil.copy(self.path_record, path_dump)
 
     def to_dict(self):
@@ -175,200 +1052,1456 @@ class Recorder:
         :return: the results
         :rtype: dict
         """
-        return self.__record
+        if self.bounded_memory:
+            return dict(self.iter_records())
+        if len(self.__metrics) == 0:
+            return self.__record
+        ret = dict(self.__record)
+        for series in self.__metrics.values():
+            ret.update(series.items())
+        return ret
 
     def show(self):
         """
-        To show the reuslts in logger.
+        To show the reuslts in logger. In bounded_memory mode, the records are streamed from disk in recording order.
         """
+        if self.bounded_memory:
+            for k, v in self.iter_records():
+                logging_info("%s: %s" % (k, json.dumps(v, default=_json_default)))
+            return
         logging_info(
             "\n%s"
             % json.dumps(
-                self.__record, sort_keys=True, indent=4, separators=(",", ": ")
+                self.to_dict(),
+                sort_keys=True,
+                indent=4,
+                separators=(",", ": "),
+                default=_json_default,
             )
         )
 
 
-def load_result(path_record, return_type="dict"):
+def expand_record_line(line):
+    """
+    Convert a parsed line of a record file into flat key-value pairs, i.e., a structured metric record is expanded to
+    its flat key.
+    :param line: the parsed line
+    :type line: dict
+    :return: the flat key-value pairs
+    :rtype: dict
+    """
+    if METRIC_SIGNAL in line:
+        metric = line[METRIC_SIGNAL]
+        return {
+            get_metric_key(metric["key"], metric["epoch"], metric["step"]): metric[
+                "value"
+            ]
+        }
+    return line
+
+
+def _iter_record_lines(fin):
+    """
+    Iterate over the (offset, parsed line) of a binary record file until the END signal.
+    """
+    offset = fin.tell()
+    for line in fin:
+        if line.strip() == b"$END$":
+            return
+        if len(line.strip()) != 0:
+            yield offset, json.loads(line)
+        offset += len(line)
+
+
+def write_result_summary(path_record):
+    """
+    Append a summary block after the END signal of an ended record: the config, the meta_data, the final value of
+    every metric and the byte offsets of the lines of each metric series. A fixed-length footer pointing at the
+    block is written at the very end, so load_result(summary_only=True) can seek to it directly. Readers stopping at
+    the END signal are not affected.
+    :param path_record: the path of the ended record
+    :type path_record: str
+    """
+    summary = {"config": dict(), "meta_data": dict(), "metrics": dict()}
+    offsets = dict()
+    with open_record(path_record) as fin:
+        for offset, line in _iter_record_lines(fin):
+            if METRIC_SIGNAL in line:
+                metric = line[METRIC_SIGNAL]
+                line = {metric["key"]: metric["value"]}
+            for k, v in line.items():
+                if k.startswith("config.") or k.startswith("meta_data."):
+                    summary[k.split(".", 1)[0]][k.split(".", 1)[1]] = v
+                    continue
+                name = parse_metric_key(k)[0]
+                summary["metrics"][name] = v
+                offsets.setdefault(name, []).append(offset)
+
+    with open(path_record, "ab") as fout:
+        offset_summary = fout.tell()
+        fout.write(("%s %s\n" % (SUMMARY_SIGNAL, json.dumps(summary))).encode())
+        offset_offsets = fout.tell()
+        fout.write(("%s %s\n" % (OFFSETS_SIGNAL, json.dumps(offsets))).encode())
+        fout.write(
+            (
+                "%s %020d %020d\n" % (FOOTER_SIGNAL, offset_summary, offset_offsets)
+            ).encode()
+        )
+
+
+def _read_footer(fin):
+    """
+    Return the offsets of the summary and of the series offsets in a binary record file, None if no footer.
+    """
+    fin.seek(0, os.SEEK_END)
+    if fin.tell() < FOOTER_LENGTH:
+        return None
+    fin.seek(-FOOTER_LENGTH, os.SEEK_END)
+    footer = fin.read().split()
+    if len(footer) != 3 or footer[0] != FOOTER_SIGNAL.encode():
+        return None
+    return int(footer[1]), int(footer[2])
+
+
+def _read_signal_line(fin, offset, signal):
+    fin.seek(offset)
+    line = fin.readline().decode("utf-8")
+    assert line.startswith(signal)
+    return json.loads(line[len(signal) :])
+
+
+def load_result_summary(path_record):
+    """
+    Load only the summary block written by end_recording, without reading the records.
+    :param path_record: the path of the record
+    :type path_record: str
+    :return: the summary with "config", "meta_data" and "metrics", None if the record has no summary
+    :rtype: dict
+    """
+    with open_record(path_record) as fin:
+        footer = _read_footer(fin)
+        if footer is None:
+            return None
+        return _read_signal_line(fin, footer[0], SUMMARY_SIGNAL)
+
+
+def load_metric_series(path_record, key):
+    """
+    Load one metric series by seeking to its lines with the offsets in the summary block. Records without the
+    summary are fully scanned instead.
+    :param path_record: the path of the record
+    :type path_record: str
+    :param key: the metric name
+    :type key: str
+    :return: the series, the times of non-structured records are NaN
+    :rtype: MetricSeries
+    """
+    ret = MetricSeries(key)
+    dir_record = os.path.dirname(path_record)
+
+    def add_line(line):
+        if METRIC_SIGNAL in line:
+            metric = line[METRIC_SIGNAL]
+            if metric["key"] == key:
+                value = load_arrays({key: metric["value"]}, dir_record)[key]
+                ret.append(metric["epoch"], metric["step"], metric["time"], value)
+            return
+        for k, v in load_arrays(line, dir_record).items():
+            name, epoch, step = parse_metric_key(k)
+            if name == key:
+                ret.append(epoch, step, np.nan, v)
+
+    with open_record(path_record) as fin:
+        footer = _read_footer(fin)
+        if footer is None:
+            fin.seek(0)
+            for _, line in _iter_record_lines(fin):
+                add_line(line)
+            return ret
+        for offset in _read_signal_line(fin, footer[1], OFFSETS_SIGNAL).get(key, []):
+            fin.seek(offset)
+            add_line(json.loads(fin.readline()))
+    return ret
+
+
+def load_result(path_record, return_type="dict", summary_only=False):
     """
     Load the result based on path_record.
     :param path_record: the path of the record
     :type path_record: str
     :param return_type: "dict" or "dataframe"
+    :param summary_only: whether only read the summary block (see write_result_summary) by seeking, in which case the
+    returned dict contains the config, the meta_data and the final value of each metric. Records without the summary
+    are fully loaded instead.
+    :type summary_only: bool
     :return: the result and whether the result record is ended
     :rtype: dict, bool
     """
+    if summary_only:
+        summary = load_result_summary(path_record)
+        if summary is not None:
+            ret = {"path": path_record}
+            for k in ["config", "meta_data"]:
+                ret.update({"%s.%s" % (k, kk): v for kk, v in summary[k].items()})
+            ret.update(load_arrays(summary["metrics"], os.path.dirname(path_record)))
+            if return_type == "dataframe":
+                ret = pd.DataFrame(pd.Series(ret)).transpose()
+            return ret, True
+
     ret = dict()
-    with open(path_record, "r", encoding="utf-8") as fin:
+    with io.TextIOWrapper(open_record(path_record), encoding="utf-8") as fin:
         ret["path"] = path_record
         for line in fin.readlines():
             if line.strip() == "$END$":
                 return ret, True
             if len(line.strip().split()) == 0:
                 continue
-            ret.update(json.loads(line))
+            ret.update(
+                load_arrays(
+                    expand_record_line(json.loads(line)), os.path.dirname(path_record)
+                )
+            )
     if return_type == "dataframe":
         ret = pd.DataFrame(pd.Series(ret)).transpose()
     return ret, False
 
 
+def load_metrics(path_record):
+    """
+    Load the structured metric records (see Recorder.add_metric) based on path_record.
+    :param path_record: the path of the record
+    :type path_record: str
+    :return: metric name -> series
+    :rtype: dict
+    """
+    ret = dict()
+    dir_record = os.path.dirname(path_record)
+    with io.TextIOWrapper(open_record(path_record), encoding="utf-8") as fin:
+        for line in fin:
+            if line.strip() == "$END$":
+                break
+            if METRIC_SIGNAL not in line:
+                continue
+            metric = json.loads(line).get(METRIC_SIGNAL)
+            if metric is None:
+                continue
+            key = metric["key"]
+            if key not in ret:
+                ret[key] = MetricSeries(key)
+            value = load_arrays({key: metric["value"]}, dir_record)[key]
+            ret[key].append(metric["epoch"], metric["step"], metric["time"], value)
+    return ret
+
+
+def get_file_version(path_file):
+    """
+    Return a version string of a file, which changes whenever the file is rewritten or appended.
+    :param path_file: the path of the file
+    :type path_file: str
+    :return: "path:mtime:size", or "path:missing" if the file does not exist
+    :rtype: str
+    """
+    if not os.path.exists(path_file):
+        return "%s:missing" % path_file
+    stat_result = os.stat(path_file)
+    return "%s:%d:%d" % (path_file, stat_result.st_mtime_ns, stat_result.st_size)
+
+
+def get_run_id(record):
+    """
+    Return a content-stable id of a run, the hash of its config and meta_data, which stays the same wherever the
+    result file is copied to. Missing values are ignored and integral floats are hashed as integers, since a column
+    with missing values is stored as float in the collected results.
+    :param record: the result record, or a row of the collected results
+    :type record: dict or pd.Series
+    :return: the run id
+    :rtype: str
+    """
+    items = []
+    for k, v in record.items():
+        if not (k.startswith("config.") or k.startswith("meta_data.")):
+            continue
+        if isinstance(v, np.generic):
+            v = v.item()
+        if isinstance(v, float):
+            if math.isnan(v):
+                continue
+            if v.is_integer():
+                v = int(v)
+        elif v is None or v is pd.NA:
+            continue
+        items.append((k, v))
+    content = json.dumps(sorted(items), default=_json_default)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def scan_result_files(dir_results, suffix=".result"):
+    """
+    Recursively find all the files ending with suffix in dir_results, including those inside packs (see
+    result_archive.pack_results). The shard directories of a directory with a manifest (see nn_utils.get_all_paths)
+    are not walked, the runs listed in the manifest are looked up directly instead, and only the packs directly
+    inside the shard directories are read.
+    :param dir_results: the directory to be scanned
+    :type dir_results: str
+    :param suffix: the suffix of the files
+    :type suffix: str
+    :return: an iterator of (path, mtime, size)
+    """
+    dirs_to_scan = [dir_results]
+    while len(dirs_to_scan) != 0:
+        dir_current = dirs_to_scan.pop()
+        manifest = read_manifest(dir_current)
+        shards = set()
+        if manifest is not None:
+            for entry in manifest:
+                shards.add(entry.get("shard"))
+                path = os.path.join(dir_current, *entry["path"].split("/")) + suffix
+                try:
+                    stat_result = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat_result.st_mtime, stat_result.st_size
+        with os.scandir(dir_current) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in shards:
+                        dirs_to_scan.append(entry.path)
+                        continue
+                    # the runs of a shard are in the manifest, but they could have been packed inside the shard
+                    with os.scandir(entry.path) as it_shard:
+                        for entry_shard in it_shard:
+                            if entry_shard.name.endswith(PACK_SUFFIX):
+                                yield from _scan_pack(entry_shard.path, suffix)
+                elif entry.name.endswith(suffix):
+                    stat_result = entry.stat()
+                    yield entry.path, stat_result.st_mtime, stat_result.st_size
+                elif entry.name.endswith(PACK_SUFFIX):
+                    yield from _scan_pack(entry.path, suffix)
+
+
+def _scan_pack(path_pack, suffix):
+    index = get_pack(path_pack).get_index()
+    for member, (_, _, size, _, mtime) in index.items():
+        if member.endswith(suffix):
+            yield os.path.join(path_pack, member), mtime, size
+
+
+def _load_ended_results(paths):
+    """
+    Load a chunk of result files, used by the worker processes of collect_results.
+    :param paths: the paths of the result files
+    :return: a list of (path, result or None if not ended, whether failed)
+    """
+    ret = []
+    for path in paths:
+        try:
+            result, ended = load_result(path)
+            ret.append((path, result if ended else None, False))
+        except JSONDecodeError:
+            ret.append((path, None, True))
+    return ret
+
+
+def load_ended_results(paths, num_workers=None, chunksize=64):
+    """
+    Load the result files in a process pool.
+    :param paths: the paths of the result files
+    :type paths: list
+    :param num_workers: the number of worker processes, os.cpu_count() if None, no pool is used if <= 1
+    :type num_workers: int
+    :param chunksize: the number of files sent to a worker at once
+    :type chunksize: int
+    :return: an iterator of (path, result or None if not ended, whether failed), in the order of paths
+    """
+    num_workers = os.cpu_count() if num_workers is None else num_workers
+    chunks = [paths[i : i + chunksize] for i in range(0, len(paths), chunksize)]
+    with tqdm.tqdm(total=len(paths)) as progress_bar:
+        if num_workers <= 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                yield from _load_ended_results(chunk)
+                progress_bar.update(len(chunk))
+            return
+        with ProcessPoolExecutor(max_workers=min(num_workers, len(chunks))) as pool:
+            # in submission order, so the order of the collected rows does not depend on the scheduling
+            for chunk_results in pool.map(_load_ended_results, chunks):
+                yield from chunk_results
+                progress_bar.update(len(chunk_results))
+
+
 def collect_results(
-    dir_results, collect_condition_func=None, pickled_filename=".pickled_results.jbl"
+    dir_results,
+    collect_condition_func=None,
+    pickled_filename=".pickled_results.jbl",
+    num_workers=None,
+    chunksize=64,
+    cache_format="pickle",
+    columns=None,
+    summary_condition_func=None,
+    return_type="wide",
 ):
     """
-    Collect all the ended results in dir_results.
+    Collect all the ended results in dir_results. Collected files are indexed by (path, mtime, size) beside the
+    cached results, so only new or modified files are parsed, in a process pool.
     :param dir_results: the directory of the reuslts to be collected
     :type dir_results: str
     :param collect_condition_func: function to judge whether collect or not
-    :param pickled_filename: filename of the pickled file
+    :param pickled_filename: filename of the pickled file, or directory name of the columnar cache
+    :param num_workers: the number of worker processes for parsing, os.cpu_count() if None, no pool if <= 1
+    :type num_workers: int
+    :param chunksize: the number of files sent to a worker at once
+    :type chunksize: int
+    :param cache_format: "pickle" rewrites one joblib pickle of everything, "columnar" appends new results as new
+    partitions of a ResultCache
+    :type cache_format: str
+    :param columns: the columns to be returned, all if None. Only these columns are loaded for "columnar".
+    :type columns: list
+    :param summary_condition_func: function to judge whether collect or not based on the summary of the record,
+    i.e., load_result(file_path, summary_only=True)[0], which only seeks to the summary block of the file
+    :param return_type: "wide" returns one column per epoch/step-keyed metric, "long" returns the long table and
+    the config table of to_long_format, converted partition by partition for "columnar"
+    :type return_type: str
     :return: all ended result records
-    :rtype: pd.DataFrame
+    :rtype: pd.DataFrame or tuple
     """
     assert os.path.exists(dir_results)
-    path_pickled_results = os.path.join(dir_results, pickled_filename)
-    if os.path.exists(path_pickled_results):
-        data = joblib.load(path_pickled_results)
-        already_collect_list = data["path"].values
+    assert return_type in ["wide", "long"]
+    path_cache = os.path.join(dir_results, pickled_filename)
+    if cache_format == "columnar":
+        cache = ResultCache(path_cache)
+        collected_index = {k: v[:2] for k, v in cache.get_index().items()}
+    elif cache_format == "pickle":
+        path_collected_index = "%s.index" % path_cache
+        if os.path.exists(path_cache):
+            data = joblib.load(path_cache)
+            if os.path.exists(path_collected_index):
+                collected_index = joblib.load(path_collected_index)
+            else:
+                collected_index = {path: None for path in data["path"].values}
+        else:
+            data = pd.DataFrame()
+            collected_index = dict()
     else:
-        data = pd.DataFrame()
-        already_collect_list = []
-
-    updated = False
-    to_be_read = []
-    for path, dir_list, file_list in os.walk(dir_results):
-        for file_name in file_list:
-            file_path = os.path.join(path, file_name)
-            if not os.path.isdir(file_path) and file_path.endswith(".result"):
-                if file_path not in already_collect_list:
-                    if collect_condition_func is None or collect_condition_func(
-                        file_path
-                    ):
-                        to_be_read.append(file_path)
+        raise NotImplementedError
+
+    to_be_read, file_stats, modified = [], dict(), set()
+    scanned, packed_sources = set(), set()
+    for file_path, mtime, size in scan_result_files(dir_results):
+        scanned.add(file_path)
+        if PACK_SUFFIX + os.sep in file_path:
+            # the original path of a packed member, relative to the directory of the pack
+            path_pack, member = split_pack_path(file_path, check_exists=False)
+            packed_sources.add(
+                os.path.normpath(
+                    os.path.join(os.path.dirname(path_pack), *member.split("/"))
+                )
+            )
+        if file_path in collected_index:
+            if collected_index[file_path] in [None, (mtime, size)]:
+                continue
+            modified.add(file_path)
+        if collect_condition_func is not None and not collect_condition_func(file_path):
+            continue
+        if summary_condition_func is None or summary_condition_func(
+            load_result(file_path, summary_only=True)[0]
+        ):
+            to_be_read.append(file_path)
+            file_stats[file_path] = (mtime, size)
     print("Got %d to be read." % len(to_be_read))
+    if len(packed_sources) != 0:
+        # results moved into packs are read again from the packs
+        for file_path in collected_index:
+            if (
+                file_path not in scanned
+                and os.path.normpath(file_path) in packed_sources
+            ):
+                modified.add(file_path)
 
-    new_data = list()
-    for file_path in tqdm(to_be_read):
-        try:
-            result, ended = load_result(file_path)
-            if ended:
-                new_data.append(pd.DataFrame(pd.Series(result)).transpose())
-                updated = True
-        except JSONDecodeError:
+    new_data, new_stats = list(), dict()
+    for file_path, result, failed in load_ended_results(
+        to_be_read, num_workers=num_workers, chunksize=chunksize
+    ):
+        if failed:
             print("Collection Failed at %s" % file_path)
+        elif result is not None:
+            new_data.append(result)
+            new_stats[file_path] = file_stats[file_path]
     print("Got %d new." % len(new_data))
+    outdated = [p for p in modified if p not in new_stats]
+
+    if cache_format == "columnar":
+        if len(outdated) != 0:
+            cache.remove(outdated)
+        if len(new_data) != 0:
+            cache.append(pd.DataFrame(new_data), new_stats)
+        if return_type == "long":
+            data_long, data_config = concat_long_format(
+                [
+                    to_long_format(cache.read_partition(p, columns))
+                    for p in cache.get_partitions()
+                ]
+            )
+            data_long.attrs["collection_version"] = get_file_version(cache.path_index)
+            return data_long, data_config
+        data = cache.read(columns)
+        data.attrs["collection_version"] = get_file_version(cache.path_index)
+        get_column_index(data)
+        return data
+
+    if len(new_data) != 0 or len(modified) != 0:
+        if len(modified) != 0:
+            data = data[~data["path"].isin(modified)]
+        for file_path in outdated:
+            collected_index.pop(file_path, None)
+        collected_index.update(new_stats)
+        data = pd.concat([data, pd.DataFrame(new_data)], axis=0, ignore_index=True)
+        joblib.dump(data, path_cache)
+        joblib.dump(collected_index, path_collected_index)
+    if columns is not None:
+        data = data.reindex(columns=columns)
+    data = data.copy()
+    data.attrs["collection_version"] = get_file_version(path_cache)
+    if return_type == "long":
+        data_long, data_config = to_long_format(data)
+        data_long.attrs["collection_version"] = data.attrs["collection_version"]
+        return data_long, data_config
+    get_column_index(data)
+    return data
+
+
+def merge_result_caches(paths_cache, dir_merged, columns=None):
+    """
+    Merge the caches of collect_results, e.g., collected on several hosts, into one columnar ResultCache keyed by
+    run id (see get_run_id), so the same run collected from several directories is kept once. The merged caches
+    and partitions are remembered, so merging again only reads and hashes the runs added since the last merge.
+    Columnar caches are read partition by partition. A pickled cache is diffed against the index written beside it
+    by collect_results, and is only loaded (in full) if it has new or modified runs.
+    :param paths_cache: the paths of the caches, either pickled or columnar
+    :type paths_cache: list
+    :param dir_merged: the directory of the merged cache
+    :type dir_merged: str
+    :param columns: the columns to be returned, all if None
+    :type columns: list
+    :return: all merged result records, with the column "run_id"
+    :rtype: pd.DataFrame
+    """
+    cache = ResultCache(dir_merged, key="run_id")
+    path_sources = os.path.join(dir_merged, "sources.json")
+    path_merged_paths = os.path.join(dir_merged, "sources.paths.jsonl")
+    sources, merged_paths = dict(), dict()
+    if os.path.exists(path_sources):
+        with open(path_sources, "r", encoding="utf-8") as fin:
+            sources = json.load(fin)
+    if os.path.exists(path_merged_paths):
+        with open(path_merged_paths, "r", encoding="utf-8") as fin:
+            for line in fin:
+                try:
+                    source_name, path, stat_path = json.loads(line)
+                except (JSONDecodeError, ValueError):
+                    continue
+                merged_paths.setdefault(source_name, dict())[path] = stat_path
+
+    new_data, new_lines, seen = [], [], set()
+    for path_cache in paths_cache:
+        source_name = os.path.abspath(path_cache)
+        source = sources.setdefault(source_name, dict())
+        version = get_file_version(
+            os.path.join(path_cache, ResultCache.INDEX_FILENAME)
+            if os.path.isdir(path_cache)
+            else path_cache
+        )
+        if source.get("version") == version:
+            continue
+        if os.path.isdir(path_cache):
+            source_cache = ResultCache(path_cache)
+            merged = set(source.get("partitions", []))
+            partitions = [p for p in source_cache.get_partitions() if p not in merged]
+            data = [source_cache.read_partition(p) for p in partitions]
+            source["partitions"] = sorted(merged | set(partitions))
+        else:
+            merged = merged_paths.setdefault(source_name, dict())
+            # the paths were kept in sources.json before, the mtime and size of those are unknown
+            for path in source.pop("paths", []):
+                merged[path] = None
+                new_lines.append(json.dumps([source_name, path, None]))
+            path_collected_index = "%s.index" % path_cache
+            data = None
+            if os.path.exists(path_collected_index):
+                collected_index = joblib.load(path_collected_index)
+            else:
+                data = joblib.load(path_cache)
+                collected_index = {path: None for path in data["path"].values}
+            to_be_merged = dict()
+            for path, stat_path in collected_index.items():
+                stat_path = None if stat_path is None else list(stat_path)
+                if path not in merged or merged[path] not in [None, stat_path]:
+                    to_be_merged[path] = stat_path
+            if len(to_be_merged) == 0:
+                data = []
+            else:
+                data = joblib.load(path_cache) if data is None else data
+                data = [data[data["path"].isin(list(to_be_merged))]]
+            for path, stat_path in to_be_merged.items():
+                merged[path] = stat_path
+                new_lines.append(json.dumps([source_name, path, stat_path]))
+        source["version"] = version
+        for d in data:
+            if len(d) == 0:
+                continue
+            d = d.assign(run_id=[get_run_id(r) for _, r in d.iterrows()])
+            d = d[~d["run_id"].isin(seen) & ~d["run_id"].map(cache.__contains__)]
+            d = d.drop_duplicates(subset="run_id")
+            seen.update(d["run_id"].values)
+            new_data.append(d)
+
+    print("Got %d new." % len(seen))
+    if len(new_data) != 0:
+        cache.append(pd.concat(new_data, axis=0, ignore_index=True))
+    makedir_if_not_exist(dir_merged)
+    if len(new_lines) != 0:
+        with open(path_merged_paths, "a", encoding="utf-8") as fout:
+            fout.write("".join("%s\n" % line for line in new_lines))
+    path_sources_temp = "%s.temp" % path_sources
+    with open(path_sources_temp, "w", encoding="utf-8") as fout:
+        json.dump(sources, fout)
+    os.replace(path_sources_temp, path_sources)
+    data = cache.read(columns)
+    data.attrs["collection_version"] = get_file_version(cache.path_index)
+    return data
+
+
+class ResultFingerprintIndex:
+    INDEX_FILENAME = ".fingerprints.jsonl"
+
+    def __init__(self, dir_results, ignored_keys=("load_epoch", "config_file")):
+        """
+        The index of the config fingerprints (see config.get_config_fingerprint) of the ended results in dir_results,
+        so that a launcher can check whether a config has already finished in O(1). Only the summary blocks of new
+        or modified result files are read, and the index is kept in dir_results across processes.
+
+        Examples:
+            >>> index = ResultFingerprintIndex(dir_results)
+            >>> if config in index:
+            ...     exit()
+
+        :param dir_results: the directory of the results
+        :type dir_results: str
+        :param ignored_keys: the config keys ignored by the fingerprint
+        :type ignored_keys: tuple
+        """
+        self.dir_results = dir_results
+        self.ignored_keys = tuple(ignored_keys)
+        self.path_index = os.path.join(dir_results, self.INDEX_FILENAME)
+        self.__entries = dict()
+        if os.path.exists(self.path_index):
+            with open(self.path_index, "r", encoding="utf-8") as fin:
+                for line in fin:
+                    try:
+                        path, mtime, size, ignored_keys, fingerprint = json.loads(line)
+                    except (JSONDecodeError, ValueError):
+                        continue
+                    if tuple(ignored_keys) == self.ignored_keys:
+                        self.__entries[path] = (mtime, size, fingerprint)
+        self.__fingerprints = dict()
+        self.refresh()
+
+    def refresh(self):
+        """
+        Index the result files ended since the last refresh, and forget the removed ones.
+        :return: the number of newly indexed results
+        :rtype: int
+        """
+        entries, new_lines = dict(), []
+        for path, mtime, size in scan_result_files(self.dir_results):
+            if path in self.__entries and self.__entries[path][:2] == (mtime, size):
+                entries[path] = self.__entries[path]
+                continue
+            try:
+                result, ended = load_result(path, summary_only=True)
+            except JSONDecodeError:
+                continue
+            if not ended:
+                continue
+            config = {
+                k[len("config.") :]: v
+                for k, v in result.items()
+                if k.startswith("config.")
+            }
+            fingerprint = get_config_fingerprint(config, self.ignored_keys)
+            entries[path] = (mtime, size, fingerprint)
+            new_lines.append([path, mtime, size, self.ignored_keys, fingerprint])
+        if len(new_lines) != 0:
+            with open(self.path_index, "a", encoding="utf-8") as fout:
+                fout.write("".join(json.dumps(line) + "\n" for line in new_lines))
+
+        self.__entries = entries
+        self.__fingerprints = dict()
+        for path, (_, _, fingerprint) in entries.items():
+            self.__fingerprints.setdefault(fingerprint, []).append(path)
+        return len(new_lines)
+
+    def __get_fingerprint(self, config):
+        if isinstance(config, str):
+            return config
+        return get_config_fingerprint(config, self.ignored_keys)
+
+    def __contains__(self, config):
+        return self.__get_fingerprint(config) in self.__fingerprints
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get_paths(self, config):
+        """
+        Return the paths of the ended results of a config.
+        :param config: the config, or its fingerprint
+        :return: the paths
+        :rtype: list
+        """
+        return list(self.__fingerprints.get(self.__get_fingerprint(config), []))
+
+
+class ResultTailer:
+    def __init__(self, keep_results=True):
+        """
+        Read live record files incrementally. The byte offset of every file is remembered, so each read only parses
+        the newly appended complete lines. A file that is replaced (e.g., a restarted run) or truncated is re-read from
+        the beginning.
+        :param keep_results: whether accumulate the records of every file, see get_result()
+        :type keep_results: bool
+        """
+        self.keep_results = keep_results
+        self.__offsets = dict()
+        self.__inodes = dict()
+        self.__results = dict()
+        self.__ended = dict()
+
+    def paths(self):
+        return self.__offsets.keys()
+
+    def forget(self, path):
+        """
+        Stop tracking path and drop its state.
+        """
+        for state in [self.__offsets, self.__inodes, self.__results, self.__ended]:
+            state.pop(path, None)
+
+    def read_new(self, path):
+        """
+        Read the records appended to path since the last call. An incomplete last line is left for the next call.
+        :param path: the path of the record file
+        :type path: str
+        :return: the new records as flat key-value dicts, and whether the END signal is reached
+        :rtype: list, bool
+        """
+        try:
+            fin = open(path, "rb")
+        except FileNotFoundError:
+            return [], self.__ended.get(path, False)
+        with fin:
+            stat_result = os.fstat(fin.fileno())
+            if self.__inodes.get(
+                path
+            ) != stat_result.st_ino or stat_result.st_size < self.__offsets.get(
+                path, 0
+            ):
+                self.forget(path)
+                self.__inodes[path] = stat_result.st_ino
+                self.__results[path] = {"path": path}
+            offset = self.__offsets.get(path, 0)
+            if self.__ended.get(path, False) or stat_result.st_size == offset:
+                self.__offsets[path] = offset
+                return [], self.__ended.get(path, False)
+            fin.seek(offset)
+            content = fin.read(stat_result.st_size - offset)
+
+        records = []
+        consumed = content.rfind(b"\n") + 1
+        for line in content[:consumed].splitlines():
+            line = line.strip()
+            if line == b"$END$":
+                self.__ended[path] = True
+                break
+            if len(line) != 0:
+                records.append(
+                    load_arrays(
+                        expand_record_line(json.loads(line)), os.path.dirname(path)
+                    )
+                )
+        self.__offsets[path] = offset + consumed
+        if self.keep_results:
+            for record in records:
+                self.__results[path].update(record)
+        return records, self.__ended.get(path, False)
+
+    def poll(self, paths=None):
+        """
+        Read the new records of many files.
+        :param paths: the paths of the record files, all the tracked files if None
+        :return: path -> new records, only for the files with new records
+        :rtype: dict
+        """
+        paths = list(self.paths()) if paths is None else paths
+        ret = dict()
+        for path in paths:
+            records, _ = self.read_new(path)
+            if len(records) != 0:
+                ret[path] = records
+        return ret
+
+    def is_ended(self, path):
+        return self.__ended.get(path, False)
+
+    def get_result(self, path):
+        """
+        Return all the records read from path so far, the same as load_result(path)[0] if up to date.
+        :rtype: dict
+        """
+        assert self.keep_results
+        return self.__results[path]
+
+    def follow(self, dir_results, interval=5.0, suffix=".result.temp"):
+        """
+        Watch all the live record files in dir_results, including those created later, and yield their new records
+        every interval seconds. Files that are ended or removed are no longer tracked.
+        :param dir_results: the directory of the results
+        :type dir_results: str
+        :param interval: the seconds between two polls
+        :type interval: float
+        :param suffix: the suffix of the files to be watched
+        :type suffix: str
+        :return: an iterator of (path, new records)
+        """
+        while True:
+            for path, _, _ in scan_result_files(dir_results, suffix):
+                if path not in self.__offsets:
+                    self.__offsets[path] = 0
+            for path in list(self.paths()):
+                records, ended = self.read_new(path)
+                if len(records) != 0:
+                    yield path, records
+                if ended or not os.path.exists(path):
+                    self.forget(path)
+            time.sleep(interval)
+
+
+class DistributedRecorder:
+    REDUCE_FUNCTIONS = {"mean": np.mean, "sum": np.sum, "max": np.max, "min": np.min}
+
+    def __init__(
+        self,
+        path_record,
+        config=None,
+        rank=None,
+        world_size=None,
+        reduce_ops=("mean",),
+        timeout=600.0,
+        **kwargs,
+    ):
+        """
+        A recorder for multi-process training, writing one consolidated record. Rank 0 owns a Recorder; the other
+        ranks only append their metrics to a buffered per-rank spool file next to path_record, so they neither collide
+        on the record nor export the environment. Rank 0 tails the spool files and, once every rank has reported a
+        (key, epoch, step), records its reductions over ranks.
+        :param path_record: the saving path of the recorded results
+        :type path_record: str
+        :param config: the config, only recorded by rank 0
+        :param rank: the rank of this process, read from the environment variable RANK if None
+        :type rank: int
+        :param world_size: the number of processes, read from the environment variable WORLD_SIZE if None
+        :type world_size: int
+        :param reduce_ops: the reductions over ranks, among "mean", "sum", "max" and "min". The first one is recorded
+        under the key itself and the others under key_op, e.g., "loss_max".
+        :type reduce_ops: tuple
+        :param timeout: the seconds rank 0 waits for the other ranks in end_recording()
+        :type timeout: float
+        :param kwargs: other parameters of Recorder for rank 0
+        """
+        self.rank = int(os.environ.get("RANK", 0)) if rank is None else rank
+        self.world_size = (
+            int(os.environ.get("WORLD_SIZE", 1)) if world_size is None else world_size
+        )
+        assert all(op in self.REDUCE_FUNCTIONS for op in reduce_ops)
+        self.reduce_ops = reduce_ops
+        self.timeout = timeout
+        self.paths_spool = [
+            "%s.rank_%d.spool" % (path_record, r) for r in range(self.world_size)
+        ]
+        self.__last_index = None
+
+        if self.rank == 0:
+            self.recorder = Recorder(path_record, config=config, **kwargs)
+            self.writer = None
+            self.__tailer = ResultTailer(keep_results=False)
+            self.__pending = dict()
+        else:
+            self.recorder = None
+            open(self.paths_spool[self.rank], "w").close()
+            self.writer = BufferedRecordWriter(self.paths_spool[self.rank])
+
+    def add(self, key, value, epoch=None, step=None):
+        """
+        Add the value of this rank for (key, epoch, step).
+        """
+        if isinstance(value, np.generic):
+            value = value.item()
+        if self.rank != 0:
+            self.writer.write(
+                json.dumps(
+                    {
+                        METRIC_SIGNAL: {
+                            "key": key,
+                            "epoch": epoch,
+                            "step": step,
+                            "time": time.time(),
+                            "value": value,
+                        }
+                    },
+                    default=_json_default,
+                )
+            )
+            return get_metric_key(key, epoch, step), value
+
+        flat_key = get_metric_key(key, epoch, step)
+        self.__pending.setdefault(flat_key, dict())[0] = value
+        if (epoch, step) != self.__last_index:
+            self.__last_index = (epoch, step)
+            self.sync()
+        return flat_key, value
+
+    def add_with_logging(self, key, value, msg=None, epoch=None, step=None):
+        key, value = self.add(key, value, epoch, step)
+        if self.rank == 0:
+            logging_info("%s: %s" % (key, str(value)) if msg is None else msg % value)
+
+    def update(self, new_record, epoch=None):
+        for k in new_record.keys():
+            self.add(k, new_record[k], epoch)
+
+    def __setitem__(self, key, value):
+        """
+        Set result[key] = value on rank 0, ignored on the other ranks.
+        """
+        if self.rank == 0:
+            self.recorder[key] = value
+
+    def __reduce_pending(self, flat_key):
+        values = [
+            v.item() if isinstance(v, np.generic) else v
+            for _, v in sorted(self.__pending.pop(flat_key).items())
+        ]
+        if not all(isinstance(v, (bool, int, float)) for v in values):
+            self.recorder[flat_key] = values[0]
+            return
+        name, epoch, step = parse_metric_key(flat_key)
+        for i, op in enumerate(self.reduce_ops):
+            self.recorder.add(
+                name if i == 0 else "%s_%s" % (name, op),
+                float(self.REDUCE_FUNCTIONS[op](values)),
+                epoch,
+                step,
+            )
+
+    def sync(self, force=False):
+        """
+        Read the new metrics of the other ranks, and record the reductions of the keys reported by every rank. Only
+        meaningful on rank 0.
+        :param force: whether also record the keys not reported by every rank
+        :type force: bool
+        :return: whether all the other ranks have ended
+        :rtype: bool
+        """
+        if self.rank != 0:
+            return True
+        for r in range(1, self.world_size):
+            records, _ = self.__tailer.read_new(self.paths_spool[r])
+            for record in records:
+                for flat_key, value in record.items():
+                    self.__pending.setdefault(flat_key, dict())[r] = value
+        for flat_key in list(self.__pending.keys()):
+            if force or len(self.__pending[flat_key]) == self.world_size:
+                self.__reduce_pending(flat_key)
+        return all(
+            self.__tailer.is_ended(self.paths_spool[r])
+            for r in range(1, self.world_size)
+        )
+
+    def end_recording(self):
+        """
+        End the recording. The other ranks close their spool files; rank 0 waits for them (up to timeout seconds),
+        records the remaining reductions, ends its Recorder and removes the spool files.
+        """
+        if self.rank != 0:
+            self.writer.write("\n$END$\n")
+            self.writer.close()
+            return
 
-    if updated:
-        new_data = pd.concat(new_data, axis=0)
-        data = pd.concat([data, new_data], axis=0)
-        joblib.dump(data, path_pickled_results)
-    return data.copy()
+        start_time = time.time()
+        while not self.sync() and time.time() - start_time < self.timeout:
+            time.sleep(0.5)
+        if not self.sync(force=True):
+            logging.warning("Not all ranks ended before the timeout!")
+        self.recorder.end_recording()
+        for path_spool in self.paths_spool[1:]:
+            if os.path.exists(path_spool):
+                os.remove(path_spool)
 
 
-def collect_dead_results(dir_results):
+def collect_dead_results(dir_results, tailer=None):
     """
     Collect all un-ended results.
     :param dir_results: the directory of the reuslts to be collected
     :type dir_results: str
+    :param tailer: if provided, the files are read incrementally with it, so polling the same directory repeatedly
+    only parses the newly appended records
+    :type tailer: ResultTailer
     :return: all un-ended result records.
     :rtype: pd.DataFrame
     """
     assert os.path.exists(dir_results)
     data = list()
-    for path, dir_list, file_list in os.walk(dir_results):
-        for file_name in file_list:
-            path_file = os.path.join(path, file_name)
-            if not os.path.isdir(path_file) and path_file.endswith(".result.temp"):
-                result, ended = load_result(os.path.join(path_file))
-                if not ended:
-                    data.append(pd.DataFrame(pd.Series(result)).transpose())
-    data = pd.concat(data, axis=0)
+    for path_file, _, _ in scan_result_files(dir_results, ".result.temp"):
+        if tailer is not None:
+            _, ended = tailer.read_new(path_file)
+            result = tailer.get_result(path_file)
+        else:
+            result, ended = load_result(path_file)
+        if not ended:
+            data.append(result)
+    if tailer is not None:
+        for path_file in list(tailer.paths()):
+            if not os.path.exists(path_file):
+                tailer.forget(path_file)
+    data = pd.DataFrame(data)
     return data
 
 
-def get_max_epoch(data):
-    data = data.dropna(axis=1, how="all")
-    ret = -0x3F3F3F3F
-    for c in data.columns:
-        if c.startswith("epoch_"):
-            try:
-                epoch = int(c.split("-")[0].split("_")[1])
-            except ValueError:
+class ColumnIndex:
+    def __init__(self, columns):
+        """
+        The parsed index of the epoch/step-keyed columns, e.g., "epoch_12-step_300-val_acc" or "step_300-loss", of
+        collected results. Every column name is parsed once, after which the columns are looked up by (epoch, step,
+        metric). A missing epoch or step is stored as -1.
+        :param columns: the columns of the collected results
+        :type columns: pd.Index
+        """
+        positions, epochs, steps, metrics = [], [], [], []
+        for i, c in enumerate(columns):
+            if not (
+                isinstance(c, str) and (c.startswith("epoch_") or c.startswith("step_"))
+            ):
+                continue
+            name, epoch, step = parse_metric_key(c)
+            if epoch is None and step is None:
                 continue
-            ret = max(ret, epoch)
+            positions.append(i)
+            epochs.append(-1 if epoch is None else epoch)
+            steps.append(-1 if step is None else step)
+            metrics.append(name)
+        self.positions = np.array(positions, dtype=np.int64)
+        self.epochs = np.array(epochs, dtype=np.int64)
+        self.steps = np.array(steps, dtype=np.int64)
+        self.metrics = np.array(metrics, dtype=object)
+        self.__lookup = {
+            (None if e == -1 else e, None if st == -1 else st, m): p
+            for p, e, st, m in zip(positions, epochs, steps, metrics)
+        }
+
+    def __len__(self):
+        return len(self.positions)
+
+    def get_position(self, epoch, metric, step=None):
+        """
+        Return the position of the column of (epoch, step, metric), or None if it is not recorded.
+        """
+        return self.__lookup.get((epoch, step, metric), None)
+
+    def get_positions(self, metric, step_level=False):
+        """
+        Return the positions and the epochs of the columns of a metric, sorted by epoch.
+        :param metric: the metric name
+        :type metric: str
+        :param step_level: whether return the step-level columns instead of the epoch-level ones
+        :type step_level: bool
+        :return: the positions and the epochs (and the steps if step_level)
+        :rtype: tuple
+        """
+        mask = (self.metrics == metric) & ((self.steps != -1) == step_level)
+        order = np.lexsort((self.steps[mask], self.epochs[mask]))
+        positions, epochs = self.positions[mask][order], self.epochs[mask][order]
+        if step_level:
+            return positions, epochs, self.steps[mask][order]
+        return positions, epochs
+
+    def get_metrics(self, epoch=None):
+        """
+        Return the names of the metrics recorded, at a given epoch if provided.
+        :rtype: set
+        """
+        if epoch is None:
+            return set(self.metrics)
+        return set(self.metrics[self.epochs == epoch])
+
+
+_column_indices = dict()
+
+
+def get_column_index(data):
+    """
+    Return the parsed ColumnIndex of the columns of data. It is built once per column object and cached by identity,
+    since DataFrame.attrs are deep-copied by most pandas operations.
+    :param data: the collected results, or their columns
+    :type data: pd.DataFrame or pd.Index
+    :rtype: ColumnIndex
+    """
+    columns = data.columns if isinstance(data, pd.DataFrame) else data
+    key = id(columns)
+    if key in _column_indices and _column_indices[key][0]() is columns:
+        return _column_indices[key][1]
+    column_index = ColumnIndex(columns)
+    _column_indices[key] = (weakref.ref(columns), column_index)
+    weakref.finalize(columns, _column_indices.pop, key, None)
+    return column_index
+
+
+def to_long_format(data, value_dtype=np.float64, chunk_columns=1024):
+    """
+    Convert the wide collected results, one column per epoch/step-keyed metric, into a tidy long table and a narrow
+    config table. Only the non-missing numeric metric values are kept, converted chunk by chunk of columns.
+    :param data: the collected results
+    :type data: pd.DataFrame
+    :param value_dtype: the dtype of the value column, e.g., np.float32 to halve the memory
+    :param chunk_columns: the number of metric columns converted at once
+    :type chunk_columns: int
+    :return: the long table with columns (run_id, metric, epoch, step, value), where metric is categorical and a
+    missing epoch or step is -1; and the config table of all the other columns, indexed by run_id
+    :rtype: tuple
+    """
+    column_index = get_column_index(data)
+    categories, metric_codes = np.unique(
+        column_index.metrics.astype(str), return_inverse=True
+    )
+    run_ids, column_ids, values = [], [], []
+    for start in range(0, len(column_index), chunk_columns):
+        positions = column_index.positions[start : start + chunk_columns]
+        chunk = data.iloc[:, positions].apply(pd.to_numeric, errors="coerce")
+        chunk = chunk.to_numpy(dtype=value_dtype, na_value=np.nan)
+        rows, columns = np.nonzero(~np.isnan(chunk))
+        run_ids.append(rows.astype(np.int64))
+        column_ids.append(columns + start)
+        values.append(chunk[rows, columns])
+    run_ids = np.concatenate(run_ids) if run_ids else np.zeros(0, dtype=np.int64)
+    column_ids = (
+        np.concatenate(column_ids) if column_ids else np.zeros(0, dtype=np.int64)
+    )
+    values = np.concatenate(values) if values else np.zeros(0, dtype=value_dtype)
+
+    data_long = pd.DataFrame(
+        {
+            "run_id": run_ids,
+            "metric": pd.Categorical.from_codes(
+                metric_codes[column_ids], categories=categories
+            ),
+            "epoch": column_index.epochs[column_ids].astype(np.int32),
+            "step": column_index.steps[column_ids].astype(np.int32),
+            "value": values,
+        }
+    )
+    is_config = np.ones(len(data.columns), dtype=bool)
+    is_config[column_index.positions] = False
+    data_config = data.iloc[:, np.nonzero(is_config)[0]].reset_index(drop=True)
+    data_config.index.name = "run_id"
+    return data_long, data_config
+
+
+def concat_long_format(parts):
+    """
+    Concatenate several (long table, config table) pairs returned by to_long_format, renumbering the run ids.
+    :param parts: the pairs
+    :type parts: list
+    :return: the long table and the config table
+    :rtype: tuple
+    """
+    if len(parts) == 0:
+        return to_long_format(pd.DataFrame())
+    offsets = np.cumsum([0] + [len(c) for _, c in parts[:-1]])
+    data_long = pd.concat(
+        [l.assign(run_id=l["run_id"] + o) for (l, _), o in zip(parts, offsets)],
+        axis=0,
+        ignore_index=True,
+    )
+    data_long["metric"] = pd.api.types.union_categoricals(
+        [l["metric"] for l, _ in parts]
+    )
+    data_config = pd.concat([c for _, c in parts], axis=0, ignore_index=True)
+    data_config.index.name = "run_id"
+    return data_long, data_config
+
+
+def to_wide_format(data_long, data_config):
+    """
+    Convert the long table and the config table returned by to_long_format back to the wide layout of collected
+    results.
+    :param data_long: the long table
+    :type data_long: pd.DataFrame
+    :param data_config: the config table
+    :type data_config: pd.DataFrame
+    :return: the wide collected results
+    :rtype: pd.DataFrame
+    """
+    metrics = data_long["metric"].astype(object).to_numpy()
+    epochs, steps = data_long["epoch"].to_numpy(), data_long["step"].to_numpy()
+    column_ids, keys = pd.factorize(
+        pd.MultiIndex.from_arrays([epochs, steps, metrics]), sort=True
+    )
+    wide = np.full((len(data_config), len(keys)), np.nan)
+    wide[data_long["run_id"].to_numpy(), column_ids] = data_long["value"].to_numpy()
+    columns = [
+        get_metric_key(
+            metric, None if epoch == -1 else epoch, None if step == -1 else step
+        )
+        for epoch, step, metric in keys
+    ]
+    data_metrics = pd.DataFrame(wide, columns=columns, index=data_config.index)
+    ret = pd.concat([data_config, data_metrics], axis=1)
+    ret.index.name = None
     return ret
 
 
+def get_max_epoch(data):
+    column_index = get_column_index(data)
+    recorded = data.iloc[:, column_index.positions].notna().any(axis=0).to_numpy()
+    recorded = recorded & (column_index.epochs != -1)
+    if not recorded.any():
+        return -0x3F3F3F3F
+    return int(column_index.epochs[recorded].max())
+
+
 def get_recorded_metrics(data):
-    return set([c.split("-")[-1] for c in data.columns if c.startswith("epoch_0-")])
+    return get_column_index(data).get_metrics(epoch=0)
 
 
 def get_trajectory(data, metric, filters=None, max_epoch=None):
     data_filtered = data[filters] if filters is not None else data
     assert len(data_filtered) == 1, "%d Files Located" % len(data_filtered)
-    data_filtered = data_filtered.dropna(axis=1)
     max_epoch = get_max_epoch(data_filtered) if max_epoch is None else max_epoch
 
+    positions, epochs = get_column_index(data_filtered).get_positions(metric)
+    row = data_filtered.iloc[0, positions[epochs <= max_epoch]].to_numpy()
     x, y = [], []
-    for c in data_filtered.columns:
-        if c.startswith("epoch_") and c.endswith(metric):
-            epoch = int(c.split("-")[0].split("_")[1])
-            if epoch > max_epoch:
-                continue
-            v = data_filtered[c].values[0]
-            if (type(v) in [str]) or (not np.isnan(v) and not np.isinf(v)):
-                x.append(epoch)
-                y.append(v)
-            else:
-                break
+    for epoch, v in zip(epochs, row):
+        if type(v) in [str]:
+            pass
+        elif pd.isna(v):
+            continue
+        elif np.isinf(v):
+            break
+        x.append(int(epoch))
+        y.append(v)
 
     assert len(x) == max_epoch, "%d != %d" % (len(x), max_epoch)
-    order = sorted(list(range(len(x))), key=lambda i: x[i])
-    x = [x[i] for i in order]
-    y = [y[i] for i in order]
     return x, y
 
 
+def get_trajectories(data, metrics, group_by=None, max_epoch=None):
+    """
+    Extract the per-epoch trajectories of many runs at once into a dense array, instead of calling get_trajectory
+    run by run. Only the epoch-level columns, e.g., "epoch_3-loss", are used.
+    :param data: the collected results, one run per row
+    :type data: pd.DataFrame
+    :param metrics: the metric names
+    :type metrics: list
+    :param group_by: if provided, also compute the mean, std and count curves of the runs grouped by these columns
+    :type group_by: list
+    :param max_epoch: the last epoch to be extracted, the largest recorded epoch if None
+    :type max_epoch: int
+    :return: a dict with "trajectories" (runs x epochs x metrics, NaN padded), "runs" (the index of data), "epochs"
+    and "metrics"; and with group_by, "groups" (the group keys, one row per group), "group_ids" (the group of every
+    run), "mean", "std" and "count" (groups x epochs x metrics)
+    :rtype: dict
+    """
+    metrics = list(metrics)
+    column_index = get_column_index(data)
+    positions, epochs, metric_ids = [], [], []
+    for i, m in enumerate(metrics):
+        metric_positions, metric_epochs = column_index.get_positions(m)
+        positions.append(metric_positions)
+        epochs.append(metric_epochs)
+        metric_ids.append(np.full(len(metric_positions), i))
+    positions = np.concatenate(positions) if metrics else np.zeros(0, dtype=np.int64)
+    epochs = np.concatenate(epochs) if metrics else np.zeros(0, dtype=np.int64)
+    metric_ids = np.concatenate(metric_ids) if metrics else np.zeros(0, dtype=np.int64)
+    if max_epoch is None:
+        max_epoch = int(epochs.max()) if len(epochs) != 0 else -1
+    kept = epochs <= max_epoch
+    positions = positions[kept]
+    epochs, metric_ids = epochs[kept], metric_ids[kept]
+
+    trajectories = np.full((len(data), max_epoch + 1, len(metrics)), np.nan)
+    values = data.iloc[:, positions].apply(pd.to_numeric, errors="coerce")
+    trajectories[:, epochs, metric_ids] = values.to_numpy(dtype=np.float64)
+    ret = {
+        "trajectories": trajectories,
+        "runs": data.index,
+        "epochs": np.arange(max_epoch + 1),
+        "metrics": metrics,
+    }
+    if group_by is None:
+        return ret
+
+    analyzer = ColumnAnalyzer(data)
+    id_frame = analyzer.get_id_frame(list(group_by))
+    group_first, group_ids = np.unique(
+        id_frame.to_numpy(), axis=0, return_index=True, return_inverse=True
+    )[1:]
+    group_ids = group_ids.reshape(-1)
+    num_groups = len(group_first)
+    valid = ~np.isnan(trajectories)
+    count = np.zeros((num_groups,) + trajectories.shape[1:])
+    total = np.zeros_like(count)
+    np.add.at(count, group_ids, valid)
+    np.add.at(total, group_ids, np.where(valid, trajectories, 0.0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+    # two passes, since sum(x^2) - n * mean^2 cancels catastrophically for large values
+    deviation = np.where(valid, trajectories - mean[group_ids], 0.0)
+    total_square = np.zeros_like(count)
+    np.add.at(total_square, group_ids, deviation**2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.sqrt(total_square / (count - 1))
+    ret.update(
+        {
+            "groups": data[list(group_by)].iloc[group_first].reset_index(drop=True),
+            "group_ids": group_ids,
+            "mean": mean,
+            "std": np.where(count > 1, std, np.nan),
+            "count": count.astype(np.int64),
+        }
+    )
+    return ret
+
+
+def _get_config(config_path):
+    if isinstance(config_path, NestedDict):
+        return config_path
+    return Config(default_config_file=config_path, use_argparse=False)
+
+
+def _to_hashable(value):
+    if type(value) in [list, tuple]:
+        return tuple(_to_hashable(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, sort_keys=True, default=str)
+    if isinstance(value, np.ndarray):
+        return _to_hashable(value.tolist())
+    return value
+
+
+class ColumnAnalyzer:
+    def __init__(self, data, config_path=None):
+        """
+        Analyze the config columns of the collected results in bulk. Every column is hashed once into an integer id
+        column (list and dict values included, NaN as -1), on which the distinct counts are computed for all columns
+        at once. The default config is parsed once.
+        :param data: the collected results
+        :type data: pd.DataFrame
+        :param config_path: the path of the default config, or the parsed Config
+        """
+        self.data = data
+        self.config = None if config_path is None else _get_config(config_path)
+        self.__ids = dict()
+
+    def get_config_keys(self, exclude_key=()):
+        return [k for k in self.config.keys() if k not in exclude_key]
+
+    def get_ids(self, column):
+        """
+        Return the stable id column of a column: equal values share an id, NaN is -1.
+        :param column: the column name
+        :type column: str
+        :return: the ids
+        :rtype: np.ndarray
+        """
+        if column not in self.__ids:
+            values = self.data[column]
+            if values.dtype == object:
+                values = values.map(_to_hashable, na_action="ignore")
+            self.__ids[column] = pd.factorize(values, use_na_sentinel=True)[0]
+        return self.__ids[column]
+
+    def get_id_frame(self, columns):
+        """
+        Return the id columns of columns as one integer DataFrame.
+        """
+        return pd.DataFrame(
+            {c: self.get_ids(c) for c in columns}, index=self.data.index
+        )
+
+    def count_distinct(self, columns):
+        """
+        Count the distinct values of each column, NaN counted as one value.
+        :param columns: the column names
+        :type columns: list
+        :return: column -> number of distinct values
+        :rtype: pd.Series
+        """
+        columns = [c for c in columns if c in self.data.columns]
+        if len(columns) == 0 or len(self.data) == 0:
+            return pd.Series(0, index=columns, dtype=np.int64)
+        ids = self.get_id_frame(columns).to_numpy()
+        return pd.Series(ids.max(axis=0) + 1 + (ids == -1).any(axis=0), index=columns)
+
+    def get_informative_columns(self, exclude_key=()):
+        """
+        Return the config keys taking more than one value in data.
+        """
+        config_keys = self.get_config_keys(exclude_key)
+        for c in config_keys:
+            if c not in self.data.columns:
+                print("Missed Key: ", c)
+        num_distinct = self.count_distinct(config_keys)
+        return list(num_distinct.index[num_distinct.values != 1])
+
+    def fill_config_na(self, prefix="", suffix="", exclude_key=()):
+        """
+        Fill the NaN of the config columns with the default config values, in bulk.
+        :return: data
+        :rtype: pd.DataFrame
+        """
+        scalar_defaults, other_defaults = dict(), dict()
+        for k in self.get_config_keys(exclude_key):
+            c = prefix + k + suffix
+            if c not in self.data.columns:
+                print("Missed Key: ", c)
+            elif isinstance(self.config[k], (list, dict)):
+                other_defaults[c] = self.config[k]
+            else:
+                scalar_defaults[c] = self.config[k]
+        if len(scalar_defaults) != 0:
+            columns = list(scalar_defaults.keys())
+            self.data[columns] = self.data[columns].fillna(scalar_defaults)
+        for c, v in other_defaults.items():
+            mask = self.data[c].isna().to_numpy()
+            if mask.any():
+                filled = self.data[c].astype(object).to_numpy(copy=True)
+                for i in np.flatnonzero(mask):
+                    filled[i] = v
+                self.data[c] = filled
+        self.__ids = {c: v for c, v in self.__ids.items() if c not in scalar_defaults}
+        for c in other_defaults:
+            self.__ids.pop(c, None)
+        return self.data
+
+
 def fill_config_na(data, config_path, prefix="", suffix="", exclude_key=()):
-    config = Config(default_config_file=config_path, use_argparse=False)
-    for k in config.keys():
-        if k not in exclude_key:
-            try:
-                data[prefix + k + suffix] = data[prefix + k + suffix].fillna(config[k])
-            except TypeError:
-                print("Unsupported Data Type: ", k)
-    return data
+    return ColumnAnalyzer(data, config_path).fill_config_na(prefix, suffix, exclude_key)
 
 
 def get_informative_columns(data, config_path):
-    config = Config(default_config_file=config_path, use_argparse=False)
-    config_keys = config.keys()
-    columns_diff = []
-    for c in config_keys:
-        if c in data.columns:
-            try:
-                v = data[c].values
-                if type(v[0]) is list:
-                    v = [tuple(vi) for vi in v]
-                if len(set(v)) != 1:
-                    columns_diff.append(c)
-            except TypeError:
-                print("Unsupported Data or Contains NaN: ", c)
-        else:
-            print("Missed Key: ", c)
-    return columns_diff
+    return ColumnAnalyzer(data, config_path).get_informative_columns()
 
 
 def get_columns_group_by(data, config_path, exclude_key=("exp_name", "random_seed")):
-    ret = []
-    config = Config(default_config_file=config_path)
-    for k in config.keys():
-        if (
-            k not in exclude_key
-            and len(set([(tuple(i) if type(i) == list else i) for i in data[k].values]))
-            != 1
-        ):
-            ret.append(k)
-    return ret
+    return ColumnAnalyzer(data, config_path).get_informative_columns(exclude_key)
 
 
 def remove_duplicate(data, keys=("phase", "exp_name")):
@@ -382,6 +2515,76 @@ def merge_phase(
     return data.merge(data_to_merge, how="inner", on=merge_on_keys, suffixes=suffixes)
 
 
+_aggregation_cache = OrderedDict()
+_pipeline_cache = OrderedDict()
+
+
+def aggregate_results(
+    data,
+    columns4group,
+    columns4show,
+    stats=("mean", "std", "count"),
+    quantiles=(),
+    data_version=None,
+    max_cached=32,
+):
+    """
+    Aggregate the results by groups: the grouping is factorized once and reused by every statistic, each computed by
+    its own grouped reduction, and the statistics are concatenated on the group index instead of merged.
+    :param data: the results
+    :type data: pd.DataFrame
+    :param columns4group: the columns to group by
+    :type columns4group: list
+    :param columns4show: the columns to be aggregated
+    :type columns4show: list
+    :param stats: the statistics among "mean", "std", "count", "sem", "min" and "max". The first one is named as the
+    column itself and the others as column_stat, e.g., "acc_std".
+    :type stats: tuple
+    :param quantiles: the quantiles, e.g., (0.25, 0.75) named as "acc_q25" and "acc_q75"
+    :type quantiles: tuple
+    :param data_version: if provided, the result is memoized by (data_version, the aggregation spec), so data must be
+    the same whenever data_version is the same
+    :type data_version: str
+    :param max_cached: the maximum number of memoized results
+    :type max_cached: int
+    :return: the aggregated results, sorted by columns4show
+    :rtype: pd.DataFrame
+    """
+    columns4group, columns4show = list(columns4group), list(columns4show)
+    cache_key = (
+        data_version,
+        tuple(columns4group),
+        tuple(columns4show),
+        tuple(stats),
+        tuple(quantiles),
+    )
+    if data_version is not None and cache_key in _aggregation_cache:
+        _aggregation_cache.move_to_end(cache_key)
+        return _aggregation_cache[cache_key].copy()
+
+    grouped = data[columns4group + columns4show].groupby(by=columns4group)
+    aggregated, names = [], []
+    for i, stat in enumerate(stats):
+        aggregated.append(getattr(grouped, stat)())
+        names.append([c if i == 0 else "%s_%s" % (c, stat) for c in columns4show])
+    for q in quantiles:
+        aggregated.append(grouped.quantile(q))
+        names.append(["%s_q%g" % (c, q * 100) for c in columns4show])
+    for frame, frame_names in zip(aggregated, names):
+        frame.columns = frame_names
+
+    columns4show_sorted = [n[j] for j in range(len(columns4show)) for n in names]
+    ret = pd.concat(aggregated, axis=1).reset_index()
+    ret = ret[columns4group + columns4show_sorted]
+    ret = ret.sort_values(by=names[0])
+
+    if data_version is not None:
+        _aggregation_cache[cache_key] = ret.copy()
+        while len(_aggregation_cache) > max_cached:
+            _aggregation_cache.popitem(last=False)
+    return ret
+
+
 def simple_read_results_pipeline(
     dir_results,
     collect_condition_func=None,
@@ -390,7 +2593,19 @@ def simple_read_results_pipeline(
     columns4show=None,
     columns4group=None,
     path_default_config=None,
+    stats=("mean", "std", "count"),
+    quantiles=(),
+    max_cached=4,
 ):
+    """
+    Collect the results, fill the missing configs with the defaults, find the informative config columns to group by
+    and aggregate the results. Given the same collection, default config and spec, the filled data and the group
+    columns are memoized, so that refreshing only re-runs what changed.
+    :param max_cached: the maximum number of memoized pipelines
+    :type max_cached: int
+    :return: all the results, and if columns4show is given, the filtered results and the aggregated results
+    :rtype: tuple
+    """
     all_data = collect_results(dir_results, collect_condition_func, pickled_filename)
     columns = [c for c in all_data.columns if not column_filtering_func(c)]
     filtered_data = all_data[columns]
@@ -398,44 +2613,44 @@ def simple_read_results_pipeline(
     if columns4show is None:
         return all_data, filtered_data
 
-    if columns4group is None and path_default_config is not None:
-        filtered_data = fill_config_na(filtered_data, path_default_config)
-        columns_diff = get_informative_columns(filtered_data, path_default_config)
-        columns_diff = [
-            c for c in columns_diff if "exp_name" not in c and "random_seed" not in c
-        ]
-        columns4group = columns_diff
+    data_version = all_data.attrs.get("collection_version")
+    if data_version is not None and path_default_config is not None:
+        data_version = "%s|%s" % (data_version, get_file_version(path_default_config))
+    cache_key = (
+        data_version,
+        tuple(columns),
+        None if columns4group is None else tuple(columns4group),
+        path_default_config is not None,
+    )
+    if data_version is not None and cache_key in _pipeline_cache:
+        _pipeline_cache.move_to_end(cache_key)
+        filtered_data, columns4group = _pipeline_cache[cache_key]
+        filtered_data = filtered_data.copy(deep=False)
+    else:
+        if columns4group is None and path_default_config is not None:
+            analyzer = ColumnAnalyzer(filtered_data.copy(), path_default_config)
+            filtered_data = analyzer.fill_config_na()
+            columns_diff = analyzer.get_informative_columns()
+            columns_diff = [
+                c
+                for c in columns_diff
+                if "exp_name" not in c and "random_seed" not in c
+            ]
+            columns4group = columns_diff
+        if data_version is not None:
+            _pipeline_cache[cache_key] = (filtered_data.copy(deep=False), columns4group)
+            while len(_pipeline_cache) > max_cached:
+                _pipeline_cache.popitem(last=False)
 
     assert columns4group is not None, "Group Keys Unprovided!"
 
-    grouped_data_mean = pd.DataFrame(
-        filtered_data[columns4group + columns4show].groupby(by=columns4group).mean()
-    ).reset_index()
-    grouped_data_std = pd.DataFrame(
-        filtered_data[columns4group + columns4show].groupby(by=columns4group).std()
-    ).reset_index()
-    grouped_data_count = pd.DataFrame(
-        filtered_data[columns4group + columns4show].groupby(by=columns4group).count()
-    ).reset_index()
-
-    grouped_data = merge_phase(
-        grouped_data_mean,
-        grouped_data_std,
-        merge_on_keys=columns4group,
-        suffixes=("", "_std"),
-    )
-    grouped_data = merge_phase(
-        grouped_data,
-        grouped_data_count,
-        merge_on_keys=columns4group,
-        suffixes=("", "_count"),
+    grouped_data = aggregate_results(
+        filtered_data,
+        columns4group,
+        columns4show,
+        stats=stats,
+        quantiles=quantiles,
+        data_version=data_version,
     )
 
-    columns4show_sorted = list(
-        np.concatenate([[c, c + "_std", c + "_count"] for c in columns4show], axis=0)
-    )
-
-    grouped_data = grouped_data[columns4group + columns4show_sorted]
-    grouped_data = grouped_data.sort_values(by=columns4show)
-
     return all_data, filtered_data, grouped_data
@@ -0,0 +1,255 @@
+import io
+import os
+import json
+import zlib
+
+PACK_SUFFIX = ".rpack"
+PACK_MAGIC = b"ZRPACK1\n"
+PACK_FOOTER_SIGNAL = b"ZRPACKIX"
+PACK_FOOTER_LENGTH = len(PACK_FOOTER_SIGNAL) + 20
+
+_opened_packs = dict()
+
+
+class ResultPack:
+    def __init__(self, path_pack):
+        """
+        A pack of result files. Every member is compressed on its own and located by an offset index at the end of
+        the pack, so one member can be read without decompressing the others. Array sidecars (.arrays) are stored
+        uncompressed, so that they can still be memory-mapped. Appending writes the new members, a new index and a
+        new footer after the current end of the pack, so the old index stays valid until the new footer is written.
+        :param path_pack: the path of the pack
+        :type path_pack: str
+        """
+        self.path_pack = path_pack
+        self.__index = None
+        self.__end = None
+
+    def get_index(self):
+        """
+        Return the index of the pack.
+        :return: member -> (offset, stored size, raw size, whether compressed, mtime)
+        :rtype: dict
+        """
+        if self.__index is None:
+            self.__index, self.__end = dict(), len(PACK_MAGIC)
+            if os.path.exists(self.path_pack):
+                with open(self.path_pack, "rb") as fin:
+                    end = os.fstat(fin.fileno()).st_size
+                    index = self.__read_index(fin, end)
+                    if index is None:
+                        # an interrupted append leaves a tail without footer, fall back to the last complete one
+                        end, index = self.__find_index(fin, end)
+                    self.__index, self.__end = index, end
+        return self.__index
+
+    @staticmethod
+    def __read_index(fin, end):
+        """
+        Read the index whose footer ends at end, or return None if there is no valid footer there.
+        """
+        if end < len(PACK_MAGIC) + PACK_FOOTER_LENGTH:
+            return None
+        fin.seek(end - PACK_FOOTER_LENGTH)
+        footer = fin.read(PACK_FOOTER_LENGTH)
+        digits = footer[len(PACK_FOOTER_SIGNAL) :]
+        if not (footer.startswith(PACK_FOOTER_SIGNAL) and digits.isdigit()):
+            return None
+        index_offset = int(digits)
+        if index_offset > end - PACK_FOOTER_LENGTH:
+            return None
+        fin.seek(index_offset)
+        try:
+            index = zlib.decompress(fin.read(end - PACK_FOOTER_LENGTH - index_offset))
+            return {k: tuple(v) for k, v in json.loads(index).items()}
+        except (zlib.error, ValueError):
+            return None
+
+    def __find_index(self, fin, end, chunk_size=1 << 20):
+        """
+        Search backwards from end for the last footer with a valid index.
+        :return: the end of that footer and the index
+        """
+        while end > len(PACK_MAGIC):
+            start = max(end - chunk_size, 0)
+            fin.seek(start)
+            chunk = fin.read(end - start + PACK_FOOTER_LENGTH)
+            position = chunk.rfind(PACK_FOOTER_SIGNAL)
+            while position != -1:
+                index = self.__read_index(fin, start + position + PACK_FOOTER_LENGTH)
+                if index is not None:
+                    return start + position + PACK_FOOTER_LENGTH, index
+                position = chunk.rfind(PACK_FOOTER_SIGNAL, 0, position)
+            end = start
+        raise AssertionError("Broken pack: %s" % self.path_pack)
+
+    def members(self):
+        return self.get_index().keys()
+
+    def __contains__(self, member):
+        return member in self.get_index()
+
+    def read(self, member):
+        """
+        Read and decompress one member.
+        :param member: the member name
+        :type member: str
+        :return: the content
+        :rtype: bytes
+        """
+        offset, size, _, compressed, _ = self.get_index()[member]
+        with open(self.path_pack, "rb") as fin:
+            fin.seek(offset)
+            content = fin.read(size)
+        return zlib.decompress(content) if compressed else content
+
+    def open(self, member):
+        """
+        Open one member as a binary file object.
+        """
+        return io.BytesIO(self.read(member))
+
+    def get_raw_offset(self, member):
+        """
+        Return the offset of an uncompressed member in the pack file, for memory mapping.
+        """
+        offset, _, _, compressed, _ = self.get_index()[member]
+        assert not compressed
+        return offset
+
+    def add(self, paths, compress_func=None):
+        """
+        Append files to the pack, followed by a new index. Members already in the pack are replaced, and the bytes of
+        the replaced members and of the old index are left unused in the pack.
+        :param paths: member -> path of the file to be added
+        :type paths: dict
+        :param compress_func: function to judge whether compress a member, all except .arrays if None
+        """
+        compress_func = (
+            (lambda m: not m.endswith(".arrays"))
+            if compress_func is None
+            else compress_func
+        )
+        self.__index = None
+        index = dict(self.get_index())
+        if not os.path.exists(self.path_pack):
+            with open(self.path_pack, "wb") as fout:
+                fout.write(PACK_MAGIC)
+        with open(self.path_pack, "r+b") as fout:
+            fout.seek(self.__end)
+            fout.truncate()
+            for member, path in paths.items():
+                with open(path, "rb") as fin:
+                    content = fin.read()
+                compressed = compress_func(member)
+                stored = zlib.compress(content) if compressed else content
+                index[member] = (
+                    fout.tell(),
+                    len(stored),
+                    len(content),
+                    compressed,
+                    os.stat(path).st_mtime,
+                )
+                fout.write(stored)
+            index_offset = fout.tell()
+            fout.write(zlib.compress(json.dumps(index).encode("utf-8")))
+            fout.write(PACK_FOOTER_SIGNAL + b"%020d" % index_offset)
+            fout.flush()
+            os.fsync(fout.fileno())
+            end = fout.tell()
+        self.__index, self.__end = index, end
+
+
+def get_pack(path_pack):
+    """
+    Return the ResultPack of path_pack, cached until the pack file changes.
+    """
+    stat_result = os.stat(path_pack)
+    version = (stat_result.st_mtime_ns, stat_result.st_size)
+    if path_pack not in _opened_packs or _opened_packs[path_pack][0] != version:
+        _opened_packs[path_pack] = (version, ResultPack(path_pack))
+    return _opened_packs[path_pack][1]
+
+
+def split_pack_path(path, check_exists=True):
+    """
+    Split a path inside a pack, e.g., "results.rpack/exp/train.result", into the pack path and the member name.
+    :param path: the path
+    :type path: str
+    :param check_exists: whether treat path as a normal file if it exists on disk
+    :type check_exists: bool
+    :return: the pack path and the member name, or (None, None) if path is not inside a pack
+    :rtype: tuple
+    """
+    if PACK_SUFFIX + os.sep not in path or (check_exists and os.path.exists(path)):
+        return None, None
+    path_pack, member = path.split(PACK_SUFFIX + os.sep, 1)
+    return path_pack + PACK_SUFFIX, member.replace(os.sep, "/")
+
+
+def open_record(path):
+    """
+    Open a result file, either on disk or inside a pack, as a binary file object.
+    :param path: the path of the result file
+    :type path: str
+    """
+    path_pack, member = split_pack_path(path)
+    if path_pack is None:
+        return open(path, "rb")
+    return get_pack(path_pack).open(member)
+
+
+def pack_results(dir_results, path_pack=None, remove=True, suffixes=(".result",)):
+    """
+    Pack all the finished result files in dir_results, and their .arrays sidecars, into a pack. Their paths become
+    path_pack/<relative path>, which load_result and collect_results read transparently.
+    :param dir_results: the directory of the results
+    :type dir_results: str
+    :param path_pack: the path of the pack, dir_results/results.rpack if None. Existing packs are appended to in
+    place, at the cost of the new files only.
+    :type path_pack: str
+    :param remove: whether remove the packed files
+    :type remove: bool
+    :param suffixes: the suffixes of the result files to be packed
+    :type suffixes: tuple
+    :return: the number of packed files
+    :rtype: int
+    """
+    path_pack = (
+        os.path.join(dir_results, "results" + PACK_SUFFIX)
+        if path_pack is None
+        else path_pack
+    )
+    paths = dict()
+    for path, dir_list, file_list in os.walk(dir_results):
+        for file_name in file_list:
+            if not file_name.endswith(suffixes):
+                continue
+            file_path = os.path.join(path, file_name)
+            member = os.path.relpath(file_path, dir_results).replace(os.sep, "/")
+            paths[member] = file_path
+            path_arrays = file_path[: -len(".result")] + ".arrays"
+            if file_name.endswith(".result") and os.path.exists(path_arrays):
+                paths[member[: -len(".result")] + ".arrays"] = path_arrays
+    if len(paths) == 0:
+        return 0
+
+    ResultPack(path_pack).add(paths)
+    if remove:
+        for path in paths.values():
+            os.remove(path)
+    return len([m for m in paths if m.endswith(suffixes)])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pack finished result files.")
+    parser.add_argument("dir_results", type=str)
+    parser.add_argument("--path_pack", type=str, default=None)
+    parser.add_argument("--keep", action="store_true", default=False)
+    args = parser.parse_args()
+    print(
+        "Packed %d results."
+        % pack_results(args.dir_results, args.path_pack, remove=not args.keep)
+    )
@@ -0,0 +1,226 @@
+import os
+import json
+import shutil
+
+import numpy as np
+
+from .general_utils import LazyModule, get_random_time_stamp, makedir_if_not_exist
+
+pd = LazyModule("pandas")
+
+
+class ResultCache:
+    INDEX_FILENAME = "index.jsonl"
+    COLUMNS_FILENAME = "columns.json"
+    DATA_FILENAME = "columns.bin"
+
+    def __init__(self, dir_cache, key="path"):
+        """
+        An appendable, partitioned columnar cache of collected results. Every append lands as a new partition
+        directory holding one file of concatenated .npy blocks, one per column, and a table of their offsets, so
+        reading seeks to the requested columns only while a partition costs two files however wide it is. The cache
+        keeps an append-only path index (path, mtime, size, partition), which can be checked without touching the
+        data.
+        :param dir_cache: the directory of the cache
+        :type dir_cache: str
+        :param key: the column identifying a row in the index, e.g., "run_id" for caches merged from several hosts
+        :type key: str
+        """
+        self.dir_cache = dir_cache
+        self.key = key
+        self.path_index = os.path.join(dir_cache, self.INDEX_FILENAME)
+        self.__index = None
+
+    def get_index(self):
+        """
+        Return the path index of the cache, loaded lazily from the index file. Later lines override earlier ones.
+        :return: path -> (mtime, size, partition)
+        :rtype: dict
+        """
+        if self.__index is None:
+            self.__index = dict()
+            if os.path.exists(self.path_index):
+                with open(self.path_index, "r", encoding="utf-8") as fin:
+                    for line in fin:
+                        if len(line.strip()) == 0:
+                            continue
+                        path, mtime, size, partition = json.loads(line)
+                        if partition is None:
+                            self.__index.pop(path, None)
+                        else:
+                            self.__index[path] = (mtime, size, partition)
+        return self.__index
+
+    def __contains__(self, path):
+        return path in self.get_index()
+
+    def __len__(self):
+        return len(self.get_index())
+
+    def __write_index(self, entries):
+        makedir_if_not_exist(self.dir_cache)
+        with open(self.path_index, "a", encoding="utf-8") as fout:
+            fout.write("".join(json.dumps(e) + "\n" for e in entries))
+        index = self.get_index()
+        for path, mtime, size, partition in entries:
+            if partition is None:
+                index.pop(path, None)
+            else:
+                index[path] = (mtime, size, partition)
+
+    def append(self, data, file_stats=None):
+        """
+        Append the rows of data as a new partition. Rows of keys already in the cache are superseded.
+        :param data: the result records, must contain the key column
+        :type data: pd.DataFrame
+        :param file_stats: key -> (mtime, size) of the result files, unknown if None
+        :type file_stats: dict
+        :return: the name of the new partition
+        :rtype: str
+        """
+        assert self.key in data.columns
+        file_stats = dict() if file_stats is None else file_stats
+        partition = "part-%s" % get_random_time_stamp()
+        while os.path.exists(os.path.join(self.dir_cache, partition)):
+            partition = "part-%s" % get_random_time_stamp()
+
+        dir_partition_temp = os.path.join(self.dir_cache, ".%s.temp" % partition)
+        makedir_if_not_exist(dir_partition_temp)
+        columns, offsets = list(data.columns), []
+        with open(os.path.join(dir_partition_temp, self.DATA_FILENAME), "wb") as fout:
+            for c in columns:
+                values = data[c].to_numpy()
+                offsets.append(fout.tell())
+                np.save(fout, values, allow_pickle=values.dtype == object)
+        with open(
+            os.path.join(dir_partition_temp, self.COLUMNS_FILENAME),
+            "w",
+            encoding="utf-8",
+        ) as fout:
+            json.dump({"columns": columns, "offsets": offsets}, fout)
+        os.rename(dir_partition_temp, os.path.join(self.dir_cache, partition))
+
+        self.__write_index(
+            [
+                [path] + list(file_stats.get(path, (None, None))) + [partition]
+                for path in data[self.key].values
+            ]
+        )
+        return partition
+
+    def remove(self, paths):
+        """
+        Remove paths from the cache. Their rows stay in the partitions but are never read again.
+        :param paths: the paths to be removed
+        """
+        index = self.get_index()
+        self.__write_index([[p, None, None, None] for p in paths if p in index])
+
+    def get_partitions(self):
+        """
+        Return all the partitions referred by the path index.
+        :return: the sorted partition names
+        :rtype: list
+        """
+        return sorted(set(v[2] for v in self.get_index().values()))
+
+    def get_columns(self, partition=None):
+        """
+        Return the columns stored in a partition, or the union over all partitions in order of appearance.
+        :param partition: the partition name, all partitions if None
+        :return: the column names
+        :rtype: list
+        """
+        if partition is not None:
+            return list(self.__read_column_table(partition))
+        return list(
+            dict.fromkeys(c for p in self.get_partitions() for c in self.get_columns(p))
+        )
+
+    def __read_column_table(self, partition):
+        """
+        Return column -> offset in the data file of a partition. Partitions written with one c%06d.npy file per
+        column, by earlier versions, have no offsets and get None instead.
+        """
+        path_columns = os.path.join(self.dir_cache, partition, self.COLUMNS_FILENAME)
+        with open(path_columns, "r", encoding="utf-8") as fin:
+            table = json.load(fin)
+        if isinstance(table, list):
+            return {c: None for c in table}
+        return dict(zip(table["columns"], table["offsets"]))
+
+    def read_partition(self, partition, columns=None):
+        """
+        Read the live rows of one partition.
+        :param partition: the partition name
+        :type partition: str
+        :param columns: the columns to be loaded, all if None
+        :type columns: list
+        :return: the rows
+        :rtype: pd.DataFrame
+        """
+        dir_partition = os.path.join(self.dir_cache, partition)
+        offsets = self.__read_column_table(partition)
+        position = {c: i for i, c in enumerate(offsets)}
+        path_data = os.path.join(dir_partition, self.DATA_FILENAME)
+        fin = open(path_data, "rb") if os.path.exists(path_data) else None
+
+        def load_column(c):
+            if offsets[c] is None:
+                return np.load(
+                    os.path.join(dir_partition, "c%06d.npy" % position[c]),
+                    allow_pickle=True,
+                )
+            fin.seek(offsets[c])
+            return np.load(fin, allow_pickle=True)
+
+        try:
+            index = self.get_index()
+            paths = load_column(self.key)
+            mask = np.array([index.get(p, (None,) * 3)[2] == partition for p in paths])
+
+            columns = list(offsets) if columns is None else columns
+            ret = pd.DataFrame(
+                {c: load_column(c)[mask] for c in columns if c in offsets},
+                index=pd.RangeIndex(int(mask.sum())),
+            )
+        finally:
+            if fin is not None:
+                fin.close()
+        return ret
+
+    def read(self, columns=None):
+        """
+        Read the live rows of the whole cache as one DataFrame.
+        :param columns: the columns to be loaded, all if None
+        :type columns: list
+        :return: the collected results
+        :rtype: pd.DataFrame
+        """
+        data = [self.read_partition(p, columns) for p in self.get_partitions()]
+        if len(data) == 0:
+            return pd.DataFrame(columns=columns)
+        ret = pd.concat(data, axis=0, ignore_index=True)
+        if columns is not None:
+            ret = ret.reindex(columns=columns)
+        return ret
+
+    def compact(self):
+        """
+        Rewrite all the live rows into one partition and remove the old partitions.
+        """
+        partitions = self.get_partitions()
+        if len(partitions) <= 1:
+            return
+        index = self.get_index()
+        data = self.read()
+        file_stats = {p: index[p][:2] for p in data[self.key].values}
+        self.append(data, file_stats)
+        for partition in partitions:
+            shutil.rmtree(os.path.join(self.dir_cache, partition))
+
+        path_index_temp = "%s.temp" % self.path_index
+        with open(path_index_temp, "w", encoding="utf-8") as fout:
+            for path, (mtime, size, partition) in self.get_index().items():
+                fout.write(json.dumps([path, mtime, size, partition]) + "\n")
+        os.replace(path_index_temp, self.path_index)